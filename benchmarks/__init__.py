@@ -0,0 +1,4 @@
+"""Offline benchmarks of vk_url_scraper against a local stand-in of the VK API and CDN.
+
+Run them with `python -m benchmarks.run --help`.
+"""
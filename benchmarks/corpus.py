@@ -0,0 +1,145 @@
+import json
+import random
+from typing import Dict, List
+
+# media urls of the corpus point to this placeholder, replaced by the fake server with its own address
+MEDIA_HOST = "http://media.invalid/"
+
+WORDS = (
+    "новости видео фото сегодня город люди власти заявил после года время news today video".split()
+)
+
+
+class Corpus:
+    """API items served by the fake VK server, keyed by "owner_id_id" like the scraper does.
+
+    Items have the shape of real wall.getById, photos.getById and video.get responses, either generated
+    with `synthetic` or loaded from a file of recorded items with `load` (media urls starting with
+    MEDIA_HOST are served by the fake CDN).
+    """
+
+    def __init__(self, walls: List[dict], photos: List[dict], videos: List[dict]) -> None:
+        self.walls = {f'{item["owner_id"]}_{item["id"]}': item for item in walls}
+        self.photos = {f'{item["owner_id"]}_{item["id"]}': item for item in photos}
+        self.videos = {f'{item["owner_id"]}_{item["id"]}': item for item in videos}
+
+    @classmethod
+    def synthetic(
+        cls,
+        walls: int = 1000,
+        photos: int = 500,
+        videos: int = 200,
+        attachments_per_wall: int = 4,
+        seed: int = 0,
+    ) -> "Corpus":
+        """Generates a corpus of community posts with photo, video and link attachments and reposts"""
+        rnd = random.Random(seed)
+        video_items = [_video(rnd, -1 - i % 50, i + 1) for i in range(videos)]
+        photo_items = [_photo(rnd, -1 - i % 50, i + 1) for i in range(photos)]
+        wall_items = []
+        for i in range(walls):
+            attachments = []
+            for _ in range(rnd.randint(0, attachments_per_wall * 2)):
+                kind = rnd.choice(["photo", "photo", "photo", "video", "link"])
+                if kind == "photo":
+                    attachments.append({"type": "photo", "photo": rnd.choice(photo_items)})
+                elif kind == "video" and video_items:
+                    video = rnd.choice(video_items)
+                    short = {k: video[k] for k in ("owner_id", "id", "title", "access_key")}
+                    attachments.append({"type": "video", "video": short})
+                else:
+                    url = f"https://example.com/{rnd.randint(0, 10**6)}"
+                    attachments.append(
+                        {"type": "link", "link": {"url": url, "title": _text(rnd, 6)}}
+                    )
+            post = _post(rnd, -1 - i % 50, i + 1, attachments)
+            if rnd.random() < 0.2:
+                post["copy_history"] = [_post(rnd, -100, i + 1, attachments[:1])]
+            wall_items.append(post)
+        return cls(wall_items, photo_items, video_items)
+
+    @classmethod
+    def load(cls, filename: str) -> "Corpus":
+        """Loads recorded items from a JSON file like {"walls": [...], "photos": [...], "videos": [...]}"""
+        with open(filename) as f:
+            data = json.load(f)
+        return cls(data.get("walls", []), data.get("photos", []), data.get("videos", []))
+
+    def save(self, filename: str) -> None:
+        with open(filename, "w") as f:
+            json.dump(
+                {
+                    "walls": list(self.walls.values()),
+                    "photos": list(self.photos.values()),
+                    "videos": list(self.videos.values()),
+                },
+                f,
+                ensure_ascii=False,
+            )
+
+    def urls(self, kinds=("wall", "photo", "video")) -> List[str]:
+        """vk.com urls of every item of the given kinds"""
+        items: Dict[str, Dict[str, dict]] = {
+            "wall": self.walls,
+            "photo": self.photos,
+            "video": self.videos,
+        }
+        return [f"https://vk.com/{kind}{key}" for kind in kinds for key in items[kind]]
+
+
+def _text(rnd: random.Random, words: int) -> str:
+    return " ".join(rnd.choice(WORDS) for _ in range(words))
+
+
+def _sizes(rnd: random.Random, name: str) -> List[dict]:
+    return [
+        {"type": t, "width": w, "height": w * 3 // 4, "url": f"{MEDIA_HOST}{name}_{t}.jpg"}
+        for t, w in (("s", 75), ("m", 130), ("x", 604), ("y", 807), ("z", 1280))
+    ]
+
+
+def _photo(rnd: random.Random, owner_id: int, id_: int) -> dict:
+    name = f"photo{owner_id}_{id_}"
+    return {
+        "album_id": -7,
+        "date": 1600000000 + rnd.randint(0, 10**8),
+        "id": id_,
+        "owner_id": owner_id,
+        "access_key": f"{rnd.getrandbits(64):x}",
+        "sizes": _sizes(rnd, name),
+        "orig_photo": {"url": f"{MEDIA_HOST}{name}.jpg", "width": 1280, "height": 960},
+        "text": _text(rnd, rnd.randint(0, 10)),
+        "likes": {"count": rnd.randint(0, 1000), "user_likes": 0},
+        "reposts": {"count": rnd.randint(0, 100)},
+    }
+
+
+def _video(rnd: random.Random, owner_id: int, id_: int) -> dict:
+    return {
+        "id": id_,
+        "owner_id": owner_id,
+        "access_key": f"{rnd.getrandbits(64):x}",
+        "title": _text(rnd, 5),
+        "description": _text(rnd, 30),
+        "duration": rnd.randint(5, 3600),
+        "date": 1600000000 + rnd.randint(0, 10**8),
+        "views": rnd.randint(0, 10**6),
+        "player": f"https://vk.com/video_ext.php?oid={owner_id}&id={id_}",
+        "image": _sizes(rnd, f"video{owner_id}_{id_}"),
+    }
+
+
+def _post(rnd: random.Random, owner_id: int, id_: int, attachments: List[dict]) -> dict:
+    return {
+        "id": id_,
+        "owner_id": owner_id,
+        "from_id": owner_id,
+        "date": 1600000000 + rnd.randint(0, 10**8),
+        "post_type": "post",
+        "text": _text(rnd, rnd.randint(5, 120)),
+        "attachments": attachments,
+        "comments": {"count": rnd.randint(0, 500), "can_post": 0},
+        "likes": {"count": rnd.randint(0, 5000), "user_likes": 0, "can_like": 1},
+        "reposts": {"count": rnd.randint(0, 500), "user_reposted": 0},
+        "views": {"count": rnd.randint(0, 10**6)},
+    }
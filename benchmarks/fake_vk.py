@@ -0,0 +1,199 @@
+import json
+import multiprocessing
+import re
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing.connection import Connection
+from typing import Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlparse
+
+from .corpus import MEDIA_HOST, Corpus
+
+EXECUTE_CALL_PATTERN = re.compile(r"API\.([\w.]+)\((\{.*?\})\)")
+
+
+class FakeVkServer:
+    """Local HTTP server standing in for api.vk.com and the userapi CDN, for offline benchmarks.
+
+    API methods (wall.getById, photos.getById, video.get and execute calls of those) answer with the
+    items of a Corpus, any other path is served as a synthetic photo. Every response can be delayed to
+    mimic network latency and API calls beyond max_requests_per_second are throttled with VK error 6.
+    """
+
+    def __init__(
+        self,
+        corpus: Corpus,
+        latency: float = 0.0,
+        media_latency: float = 0.0,
+        max_requests_per_second: Optional[float] = None,
+        photo_size: int = 64 * 1024,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        corpus : Corpus
+            Items returned by the API methods
+        latency : float
+            Seconds added to every API response
+        media_latency : float
+            Seconds added to every media response
+        max_requests_per_second : float
+            API calls beyond this rate (over a sliding second) get a "Too many requests per second" error
+        photo_size : int
+            Size in bytes of the served photos
+        """
+        self.corpus = corpus
+        self.latency = latency
+        self.media_latency = media_latency
+        self.max_requests_per_second = max_requests_per_second
+        self.photo = b"\xff\xd8" + bytes(range(256)) * (photo_size // 256)
+        # requests received per API method, media requests are counted under "media"
+        self.requests: Counter = Counter()
+        self.lock = threading.Lock()
+        self.recent: Deque[float] = deque()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/"
+
+    @property
+    def api_url(self) -> str:
+        """Pass it to HttpTransport(api_url=...)"""
+        return f"{self.base_url}method/"
+
+    def start(self) -> "FakeVkServer":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "FakeVkServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.requests.clear()
+
+    def call(self, method: str, params: Dict[str, str]) -> dict:
+        """Answers an API call like api.vk.com would"""
+        with self.lock:
+            self.requests[method] += 1
+            if self._throttled():
+                return {"error": {"error_code": 6, "error_msg": "Too many requests per second"}}
+        if method == "execute":
+            responses, errors = [], []
+            for sub_method, sub_params in EXECUTE_CALL_PATTERN.findall(params["code"]):
+                sub_res = self._get_by_id(sub_method, json.loads(sub_params))
+                if "error" in sub_res:
+                    responses.append(False)
+                    errors.append({"method": sub_method, **sub_res["error"]})
+                else:
+                    responses.append(sub_res["response"])
+            return {"response": responses, "execute_errors": errors}
+        return self._get_by_id(method, params)
+
+    def _throttled(self) -> bool:
+        if self.max_requests_per_second is None:
+            return False
+        now = time.monotonic()
+        while self.recent and self.recent[0] <= now - 1:
+            self.recent.popleft()
+        if len(self.recent) >= self.max_requests_per_second:
+            return True
+        self.recent.append(now)
+        return False
+
+    def _get_by_id(self, method: str, params: dict) -> dict:
+        if method == "wall.getById":
+            return {"response": {"items": self._items(self.corpus.walls, params["posts"])}}
+        if method == "photos.getById":
+            return {"response": self._items(self.corpus.photos, params["photos"])}
+        if method == "video.get":
+            items = self._items(self.corpus.videos, params["videos"])
+            return {"response": {"count": len(items), "items": items}}
+        return {"error": {"error_code": 3, "error_msg": f"Unknown method passed: {method}"}}
+
+    @staticmethod
+    def _items(items: Dict[str, dict], ids: str) -> List[dict]:
+        keys = ("_".join(i.split("_")[:2]) for i in ids.split(","))
+        return [items[key] for key in keys if key in items]
+
+    def _handler_class(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real servers
+
+            def do_GET(self) -> None:
+                url = urlparse(self.path)
+                self._answer(url.path, dict(parse_qsl(url.query)))
+
+            def do_POST(self) -> None:
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+                self._answer(urlparse(self.path).path, dict(parse_qsl(body)))
+
+            def _answer(self, path: str, params: Dict[str, str]) -> None:
+                if path in ("/_stats", "/_reset"):
+                    # request counters, for benchmarks running the server in another process
+                    with server.lock:
+                        stats = json.dumps(server.requests).encode()
+                    if path == "/_reset":
+                        server.reset()
+                    self._send(stats, "application/json")
+                elif path.startswith("/method/"):
+                    time.sleep(server.latency)
+                    api_res = server.call(path[len("/method/") :], params)
+                    body = json.dumps(api_res, ensure_ascii=False)
+                    # media urls of the corpus point to this server
+                    self._send(
+                        body.replace(MEDIA_HOST, server.base_url).encode(), "application/json"
+                    )
+                else:
+                    time.sleep(server.media_latency)
+                    with server.lock:
+                        server.requests["media"] += 1
+                    self._send(server.photo, "image/jpeg")
+
+            def _send(self, body: bytes, content_type: str) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+        return Handler
+
+
+def serve_in_subprocess(corpus: Corpus, **options) -> Tuple[multiprocessing.Process, str]:
+    """Runs a FakeVkServer in a child process, so that neither its CPU time nor its memory are counted
+    in the benchmarked process, options are those of FakeVkServer
+
+    Returns
+    -------
+    the process (terminate it when done) and the base url of the server
+    """
+    parent_conn, child_conn = multiprocessing.Pipe()
+    process = multiprocessing.Process(
+        target=_serve, args=(corpus, options, child_conn), daemon=True
+    )
+    process.start()
+    return process, parent_conn.recv()
+
+
+def _serve(corpus: Corpus, options: dict, conn: Connection) -> None:
+    server = FakeVkServer(corpus, **options)
+    conn.send(server.base_url)
+    server.httpd.serve_forever()
@@ -0,0 +1,243 @@
+"""Runs the offline benchmarks and optionally fails when they regress against a baseline.
+
+python -m benchmarks.run                                     # print the metrics
+python -m benchmarks.run --baseline benchmarks/baseline.json # exit 1 on regressions
+python -m benchmarks.run --baseline benchmarks/baseline.json --gate requests_per_scrape  # used in CI
+python -m benchmarks.run --save benchmarks/baseline.json     # record a new baseline
+"""
+
+import argparse
+import contextlib
+import json
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+from vk_url_scraper import HttpTransport, VkScraper
+from vk_url_scraper.__main__ import stream_ndjson
+
+from .corpus import Corpus
+from .fake_vk import serve_in_subprocess
+
+# allowed relative change of each metric before it counts as a regression, higher is worse for all but
+# throughput; timings are noisy on shared CI runners so they get more slack
+THRESHOLDS = {
+    "requests_per_scrape": 0.0,
+    "p50_ms": 0.5,
+    "p99_ms": 1.0,
+    "throughput": 0.5,
+    "peak_memory_mb": 0.25,
+}
+HIGHER_IS_BETTER = {"throughput"}
+
+# a scenario scrapes the corpus through the given transport and returns the duration of each scrape call
+# and the number of results (or files) it produced
+Scenario = Callable[[HttpTransport, Corpus, int], Tuple[List[float], int]]
+
+
+def timed(func: Callable, *args) -> Tuple[float, object]:
+    start = time.perf_counter()
+    res = func(*args)
+    return time.perf_counter() - start, res
+
+
+def scrape_walls(
+    transport: HttpTransport, corpus: Corpus, batch_size: int
+) -> Tuple[List[float], int]:
+    vks = new_scraper(transport)
+    urls = corpus.urls(["wall"])
+    durations, count = [], 0
+    for i in range(0, len(urls), batch_size):
+        duration, res = timed(vks.scrape, " ".join(urls[i : i + batch_size]))
+        durations.append(duration)
+        count += len(res)  # type: ignore
+    return durations, count
+
+
+def scrape_mixed_execute(
+    transport: HttpTransport, corpus: Corpus, batch_size: int
+) -> Tuple[List[float], int]:
+    vks = new_scraper(transport, use_execute=True)
+    urls = corpus.urls()
+    durations, count = [], 0
+    for i in range(0, len(urls), batch_size):
+        duration, res = timed(vks.scrape, " ".join(urls[i : i + batch_size]))
+        durations.append(duration)
+        count += len(res)  # type: ignore
+    return durations, count
+
+
+def cli_ndjson(
+    transport: HttpTransport, corpus: Corpus, batch_size: int
+) -> Tuple[List[float], int]:
+    vks = new_scraper(transport)
+    out = LineCounter()
+    with contextlib.redirect_stdout(out):
+        duration, _ = timed(stream_ndjson, vks, iter(corpus.urls()), batch_size, False)
+    return [duration], out.lines
+
+
+class LineCounter:
+    """Stands in for stdout, counting the lines written without keeping them in memory"""
+
+    def __init__(self) -> None:
+        self.lines = 0
+
+    def write(self, text: str) -> int:
+        self.lines += text.count("\n")
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+
+def download_photos(
+    transport: HttpTransport, corpus: Corpus, batch_size: int
+) -> Tuple[List[float], int]:
+    vks = new_scraper(transport)
+    results = vks.scrape_photo_ids([url.rsplit("/", 1)[1] for url in corpus.urls(["photo"])])
+    durations, count = [], 0
+    with tempfile.TemporaryDirectory() as tempdir:
+        for i in range(0, len(results), batch_size):
+            duration, files = timed(vks.download_media, results[i : i + batch_size], tempdir)
+            durations.append(duration)
+            count += len(files)  # type: ignore
+    return durations, count
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "scrape_walls": scrape_walls,
+    "scrape_mixed_execute": scrape_mixed_execute,
+    "cli_ndjson": cli_ndjson,
+    "download_photos": download_photos,
+}
+
+
+def run_benchmarks(
+    corpus: Corpus,
+    batch_size: int = 100,
+    latency: float = 0.005,
+    max_requests_per_second: Optional[float] = None,
+    scenarios: Optional[List[str]] = None,
+) -> Dict[str, Dict[str, float]]:
+    """Runs the scenarios against a fake VK server in a subprocess
+
+    Returns
+    -------
+    for each scenario: requests_per_scrape (API and media requests per scrape call), p50_ms and p99_ms
+    (duration of the scrape calls), throughput (results or files per second) and peak_memory_mb
+    (peak of the memory allocated by python while scraping, measured in a separate run)
+    """
+    process, base_url = serve_in_subprocess(
+        corpus,
+        latency=latency,
+        media_latency=latency,
+        max_requests_per_second=max_requests_per_second,
+    )
+    transport = HttpTransport(api_url=f"{base_url}method/", pool_maxsize=16)
+    metrics = {}
+    try:
+        for name in scenarios or SCENARIOS:
+            scenario = SCENARIOS[name]
+            transport.get(f"{base_url}_reset")
+            durations, count = scenario(transport, corpus, batch_size)
+            requests = sum(transport.get(f"{base_url}_stats").json().values())
+            tracemalloc.start()
+            scenario(transport, corpus, batch_size)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            metrics[name] = {
+                "requests_per_scrape": round(requests / len(durations), 2),
+                "p50_ms": round(statistics.median(durations) * 1000, 2),
+                "p99_ms": round(percentile(durations, 0.99) * 1000, 2),
+                "throughput": round(count / sum(durations), 1),
+                "peak_memory_mb": round(peak / 2**20, 2),
+            }
+    finally:
+        transport.close()
+        process.terminate()
+    return metrics
+
+
+def new_scraper(transport: HttpTransport, **kwargs) -> VkScraper:
+    # no client side rate limit, the fake server throttles when asked to
+    return VkScraper.from_token("token", transport=transport, requests_per_second=None, **kwargs)
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def regressions(
+    metrics: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    thresholds: Dict[str, float] = THRESHOLDS,
+) -> List[str]:
+    """Describes every metric that got worse than its baseline by more than its threshold"""
+    res = []
+    for scenario, expected in baseline.items():
+        for metric, base in expected.items():
+            value = metrics.get(scenario, {}).get(metric)
+            if value is None or metric not in thresholds:
+                continue
+            if metric in HIGHER_IS_BETTER:
+                worse = value < base * (1 - thresholds[metric])
+            else:
+                worse = value > base * (1 + thresholds[metric])
+            if worse:
+                res.append(f"{scenario}.{metric}: {value} vs baseline {base}")
+    return res
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--walls", type=int, default=1000, help="posts in the synthetic corpus")
+    parser.add_argument("--photos", type=int, default=500, help="photos in the synthetic corpus")
+    parser.add_argument("--videos", type=int, default=200, help="videos in the synthetic corpus")
+    parser.add_argument("--corpus", help="JSON file of recorded API items to use instead")
+    parser.add_argument("--batch-size", type=int, default=100, help="urls per scrape call")
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds per server response")
+    parser.add_argument("--throttle", type=float, help="API requests per second the server allows")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="only these")
+    parser.add_argument(
+        "--baseline", help="JSON file of metrics to compare with, exit 1 on regression"
+    )
+    parser.add_argument(
+        "--gate",
+        action="append",
+        choices=list(THRESHOLDS),
+        help="only exit 1 on regressions of these metrics, others are reported as warnings",
+    )
+    parser.add_argument("--save", help="write the metrics to this JSON file, eg: a new baseline")
+    args = parser.parse_args(argv)
+
+    if args.corpus:
+        corpus = Corpus.load(args.corpus)
+    else:
+        corpus = Corpus.synthetic(args.walls, args.photos, args.videos)
+    metrics = run_benchmarks(corpus, args.batch_size, args.latency, args.throttle, args.scenario)
+    print(json.dumps(metrics, indent=2))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(metrics, f, indent=2)
+            f.write("\n")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        gated = set(args.gate or THRESHOLDS)
+        found = regressions(metrics, baseline, {k: v for k, v in THRESHOLDS.items() if k in gated})
+        for regression in found:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        not_gated = {k: v for k, v in THRESHOLDS.items() if k not in gated}
+        for regression in regressions(metrics, baseline, not_gated):
+            print(f"WARNING {regression} (not gated)", file=sys.stderr)
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -52,11 +52,11 @@ setup(
     author_email="tech@bellingcat.com",
     license="MIT",
     packages=find_packages(
-        exclude=["*.tests", "*.tests.*", "tests.*", "tests"],
+        exclude=["*.tests", "*.tests.*", "tests.*", "tests", "benchmarks", "benchmarks.*"],
     ),
     package_data={"vk_url_scraper": ["py.typed"]},
     install_requires=read_requirements("requirements.txt"),
-    extras_require={"dev": read_requirements("dev-requirements.txt")},
+    extras_require={"dev": read_requirements("dev-requirements.txt"), "fast": ["orjson>=3.6"]},
     python_requires=">=3.10",
     entry_points={
         "console_scripts": [
@@ -0,0 +1,39 @@
+import asyncio
+import os
+import tempfile
+import threading
+
+from vk_url_scraper import AsyncVkScraper, HttpTransport, VkScraper
+
+from .fakes import FakeResponse, FakeSession
+
+
+def test_async_scrape_runs_lookups_concurrently_and_downloads_in_order():
+    barrier = threading.Barrier(3, timeout=5)
+
+    def fake_get(url, params):
+        if url.startswith("https://cdn"):
+            return FakeResponse(content=url.encode())
+        method = url.rsplit("/", 1)[1]
+        # all three lookups must be in flight at the same time to get past the barrier
+        barrier.wait()
+        if method == "wall.getById":
+            return FakeResponse({"response": {"items": [{"owner_id": -1, "id": 1}]}})
+        if method == "video.get":
+            return FakeResponse({"response": {"items": []}})
+        photos = [
+            {"owner_id": -1, "id": i, "orig_photo": {"url": f"https://cdn/{i}.jpg"}} for i in (2, 3)
+        ]
+        return FakeResponse({"response": photos})
+
+    vks = VkScraper("", "", token="token", transport=HttpTransport(session=FakeSession(fake_get)))
+    avks = AsyncVkScraper(vks, max_concurrent_downloads=2)
+    res = asyncio.run(avks.scrape("wall-1_1 photo-1_2 photo-1_3 video-1_4"))
+    assert [r["id"] for r in res] == ["wall-1_1", "photo-1_2", "photo-1_3"]
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        downloaded = asyncio.run(avks.download_media(res, tempdir, photo_workers=1, cache=True))
+        assert [os.path.basename(f) for f in downloaded] == ["photo-1_2_0.jpg", "photo-1_3_0.jpg"]
+        with open(downloaded[1], "rb") as f:
+            assert f.read() == b"https://cdn/3.jpg"
+        assert os.path.isfile(os.path.join(tempdir, VkScraper.MANIFEST_FILENAME))
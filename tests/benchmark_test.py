@@ -0,0 +1,66 @@
+import json
+
+from benchmarks import run
+from benchmarks.corpus import Corpus
+from benchmarks.fake_vk import FakeVkServer
+from benchmarks.run import regressions, run_benchmarks
+from vk_url_scraper import HttpTransport, VkScraper
+
+
+def test_fake_server_serves_corpus_media_and_throttles():
+    corpus = Corpus.synthetic(walls=20, photos=10, videos=5)
+    with FakeVkServer(corpus, max_requests_per_second=2) as server:
+        vks = VkScraper.from_token(
+            "token",
+            transport=HttpTransport(api_url=server.api_url),
+            requests_per_second=None,
+            max_retries=0,
+        )
+        photos = vks.scrape(" ".join(corpus.urls(["photo"])))
+        assert len(photos) == 10 and photos[0]["attachments"]["photo"][0].startswith(
+            server.base_url
+        )
+        assert server.requests == {"photos.getById": 1}
+        vks.scrape_photo_ids(["photo-1_1"])
+        assert vks.scrape_photo_ids(["photo-1_1"])[0]["error"]["code"] == 6
+
+
+def test_run_benchmarks_reports_metrics():
+    corpus = Corpus.synthetic(walls=30, photos=10, videos=5)
+    metrics = run_benchmarks(corpus, batch_size=10, latency=0, scenarios=["scrape_walls"])
+    assert metrics["scrape_walls"]["requests_per_scrape"] == 2
+    assert set(metrics["scrape_walls"]) == {
+        "requests_per_scrape",
+        "p50_ms",
+        "p99_ms",
+        "throughput",
+        "peak_memory_mb",
+    }
+
+
+def test_regressions_beyond_thresholds():
+    baseline = {"a": {"requests_per_scrape": 2, "p50_ms": 10, "throughput": 100}}
+    assert (
+        regressions({"a": {"requests_per_scrape": 2, "p50_ms": 14, "throughput": 60}}, baseline)
+        == []
+    )
+    assert regressions(
+        {"a": {"requests_per_scrape": 3, "p50_ms": 16, "throughput": 40}}, baseline
+    ) == [
+        "a.requests_per_scrape: 3 vs baseline 2",
+        "a.p50_ms: 16 vs baseline 10",
+        "a.throughput: 40 vs baseline 100",
+    ]
+
+
+def test_only_gated_metrics_fail(monkeypatch, capsys, tmp_path):
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps({"a": {"requests_per_scrape": 2, "p50_ms": 10}}))
+    slower = {"a": {"requests_per_scrape": 2, "p50_ms": 100}}
+    monkeypatch.setattr(run, "run_benchmarks", lambda *args: slower)
+
+    argv = ["--walls", "1", "--photos", "1", "--videos", "1", "--baseline", str(baseline)]
+    assert run.main(argv + ["--gate", "requests_per_scrape"]) == 0
+    assert "WARNING a.p50_ms: 100 vs baseline 10 (not gated)" in capsys.readouterr().err
+    assert run.main(argv) == 1
+    assert "REGRESSION a.p50_ms" in capsys.readouterr().err
@@ -0,0 +1,81 @@
+import os
+import tempfile
+
+import pytest
+
+from vk_url_scraper import (
+    HttpTransport,
+    MemoryCache,
+    ResponseCache,
+    SQLiteCache,
+    VkScraper,
+)
+
+from .fakes import FakeResponse, FakeSession
+
+
+def test_memory_cache_expires_and_evicts_least_recently_used():
+    now = [0.0]
+    cache = MemoryCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache.set_many({"a": {"id": 1}, "b": {"id": 2}})
+    assert cache.get_many(["a"]) == {"a": {"id": 1}}
+    cache.set_many({"c": {"id": 3}})
+    assert set(cache.get_many(["a", "b", "c"])) == {"a", "c"}
+    now[0] = 11
+    assert cache.get_many(["a", "c"]) == {}
+
+
+def test_sqlite_cache_persists_between_instances():
+    now = [100.0]
+    with tempfile.TemporaryDirectory() as tempdir:
+        filename = os.path.join(tempdir, "cache.sqlite3")
+        cache = SQLiteCache(filename, maxsize=2, ttl=10, clock=lambda: now[0])
+        cache.set_many({"a": {"id": 1}, "b": {"id": 2}})
+        now[0] = 101
+        cache.get_many(["a"])
+        now[0] = 102
+        cache.set_many({"c": {"id": 3}})
+        cache.close()
+
+        cache = SQLiteCache(filename, maxsize=2, ttl=10, clock=lambda: now[0])
+        assert cache.get_many(["a", "b", "c"]) == {"a": {"id": 1}, "c": {"id": 3}}
+        now[0] = 200
+        assert cache.get_many(["a", "c"]) == {}
+        cache.close()
+
+
+def test_scraper_only_requests_cache_misses():
+    requested = []
+
+    def fake_get(url, params):
+        requested.append(params["posts"])
+        items = [
+            {"owner_id": int(i.split("_")[0]), "id": int(i.split("_")[1]), "text": i}
+            for i in params["posts"].split(",")
+        ]
+        return FakeResponse({"response": {"items": items}})
+
+    vks = VkScraper(
+        "",
+        "",
+        token="token",
+        transport=HttpTransport(session=FakeSession(fake_get)),
+        cache=MemoryCache(),
+    )
+    vks.scrape_wall_ids(["wall-1_1", "wall-1_2"])
+    res = vks.scrape_wall_ids(["wall-1_3", "wall-1_1", "wall-1_2"])
+    assert requested == ["-1_1,-1_2", "-1_3"]
+    assert [r["text"] for r in res] == ["-1_3", "-1_1", "-1_2"]
+
+    # a different copy_history_depth is a different lookup
+    vks.scrape_wall_ids(["wall-1_1"], copy_history_depth=1)
+    assert requested[-1] == "-1_1"
+
+
+def test_incomplete_cache_fails_when_created():
+    class GetOnlyCache(ResponseCache):
+        def get_many(self, keys):
+            return {}
+
+    with pytest.raises(TypeError):
+        GetOnlyCache()
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from vk_url_scraper import __main__ as cli
+
+
+class FakeVkScraper:
+    instances: list = []
+
+    def __init__(self, username, password, token=None, video_resolution="eager"):
+        self.video_resolution = video_resolution
+        self.batch_sizes = []
+        self.downloaded = []
+        FakeVkScraper.instances.append(self)
+
+    def scrape(self, text):
+        return [{"id": text.split()[0], "text": "", "datetime": None}]
+
+    def scrape_iter(self, texts, batch_size=100):
+        self.batch_sizes.append(batch_size)
+        for text in texts:
+            for url in text.split():
+                yield {"id": url, "text": "", "datetime": None}
+
+    def download_media(self, results):
+        self.downloaded.append([r["id"] for r in results])
+
+
+@pytest.fixture(autouse=True)
+def fake_scraper(monkeypatch):
+    FakeVkScraper.instances = []
+    monkeypatch.setattr(cli, "VkScraper", FakeVkScraper)
+
+
+def run(monkeypatch, *argv):
+    monkeypatch.setattr("sys.argv", ["vk_url_scraper", "-u", "", "-p", "", *argv])
+    cli.main()
+
+
+def test_urls_json_output(monkeypatch, capsys):
+    run(monkeypatch, "--urls", "wall1_1", "photo1_2")
+    out = capsys.readouterr().out
+    assert json.loads(out) == [{"id": "wall1_1", "text": "", "datetime": None}]
+    assert out.splitlines()[1] == "    {"
+
+
+def test_input_file_ndjson(monkeypatch, capsys, tmp_path):
+    input_file = tmp_path / "urls.txt"
+    input_file.write_text("wall1_1\nphoto1_2 video1_3\n")
+    run(monkeypatch, "--input", str(input_file), "--format", "ndjson", "--batch-size", "2", "-d")
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line)["id"] for line in lines] == ["wall1_1", "photo1_2", "video1_3"]
+    vks = FakeVkScraper.instances[0]
+    assert vks.batch_sizes == [2]
+    assert vks.downloaded == [["wall1_1", "photo1_2"], ["video1_3"]]
+
+
+def test_input_stdin_combined_with_urls(monkeypatch, capsys):
+    monkeypatch.setattr("sys.stdin", iter(["photo1_2\n"]))
+    run(monkeypatch, "--input", "-", "--urls", "wall1_1")
+    assert [r["id"] for r in json.loads(capsys.readouterr().out)] == ["wall1_1", "photo1_2"]
+
+
+def test_urls_or_input_required(monkeypatch):
+    with pytest.raises(SystemExit):
+        run(monkeypatch)
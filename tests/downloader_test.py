@@ -0,0 +1,290 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from vk_url_scraper import HttpTransport, Metrics, SegmentedDownload, VkScraper
+from vk_url_scraper.downloader import MediaDownloader
+from vk_url_scraper.manifest import DownloadManifest
+
+from .fakes import FakeResponse, FakeSession
+
+
+def test_download_media_uses_pools_caps_hosts_and_keeps_order(monkeypatch):
+    lock = threading.Lock()
+    active = {}
+    peak = {}
+
+    def track(host, delta):
+        with lock:
+            active[host] = active.get(host, 0) + delta
+            peak[host] = max(peak.get(host, 0), active[host])
+
+    def fake_get(url, params):
+        host = url.split("/")[2]
+        track(host, 1)
+        time.sleep(0.01)
+        track(host, -1)
+        return FakeResponse(content=url.encode())
+
+    def fake_video(url, filename):
+        return filename.replace("%(ext)s", "mp4")
+
+    monkeypatch.setattr(MediaDownloader, "download_video", staticmethod(fake_video))
+    vks = VkScraper("", "", token="token", transport=HttpTransport(session=FakeSession(fake_get)))
+    results = [
+        {
+            "id": f"wall-1_{i}",
+            "attachments": {
+                "video": [f"https://vk.com/video_ext.php?id={i}"],
+                "photo": [f"https://cdn{j % 2}/{i}_{j}.jpg" for j in range(4)],
+            },
+        }
+        for i in range(5)
+    ]
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        downloaded = vks.download_media(results, tempdir, photo_workers=8, max_per_host=2)
+        expected = []
+        for i in range(5):
+            expected.append(f"wall-1_{i}_0.mp4")
+            expected.extend(f"wall-1_{i}_{j}.jpg" for j in range(4))
+        assert [os.path.basename(f) for f in downloaded] == expected
+        with open(os.path.join(tempdir, "wall-1_3_1.jpg"), "rb") as f:
+            assert f.read() == b"https://cdn1/3_1.jpg"
+
+    assert peak == {"cdn0": 2, "cdn1": 2}
+
+
+def test_photos_are_streamed_and_error_pages_are_not_saved():
+    def fake_get(url, params):
+        if url.endswith("404.jpg"):
+            return FakeResponse(content=b"not found", status_code=404)
+        if url.endswith("html.jpg"):
+            return FakeResponse(content=b"<html>", headers={"Content-Type": "text/html"})
+        return FakeResponse(content=b"x" * 1000, headers={"Content-Type": "image/jpeg"})
+
+    downloader = MediaDownloader(HttpTransport(session=FakeSession(fake_get)), chunk_size=64)
+    with tempfile.TemporaryDirectory() as tempdir:
+        tasks = [
+            ("photo", f"https://cdn/{name}.jpg", os.path.join(tempdir, f"{name}.jpg"))
+            for name in ("ok", "404", "html")
+        ]
+        downloaded = downloader.download_all(tasks)
+        assert [os.path.basename(f) for f in downloaded] == ["ok.jpg"]
+        assert os.listdir(tempdir) == ["ok.jpg"]
+        assert os.path.getsize(downloaded[0]) == 1000
+
+
+def test_videos_reuse_one_yt_dlp_instance_per_worker(monkeypatch):
+    instances = []
+
+    class FakeYoutubeDL:
+        def __init__(self, params):
+            self.params = {**params, "outtmpl": {"default": params["outtmpl"]}}
+            instances.append(self)
+
+        def extract_info(self, url, download):
+            # yt-dlp output goes to a logger, stdout is left alone for the other threads
+            assert sys.stdout is stdout and "logger" in self.params
+            ext = "unknown_video" if url.endswith("1") else "mp4"
+            info = {"ext": ext}
+            with open(self.prepare_filename(info), "wb") as f:
+                f.write(url.encode())
+            return info
+
+        def prepare_filename(self, info):
+            return self.params["outtmpl"]["default"].replace("%(ext)s", info["ext"])
+
+        def close(self):
+            pass
+
+    stdout = sys.stdout
+    monkeypatch.setattr("yt_dlp.YoutubeDL", FakeYoutubeDL)
+    media_downloader = MediaDownloader(HttpTransport(session=FakeSession(None)))
+    with tempfile.TemporaryDirectory() as tempdir:
+        tasks = [
+            ("video", f"https://vk.com/video-1_{i}", os.path.join(tempdir, f"v{i}.%(ext)s"))
+            for i in range(4)
+        ]
+        downloaded = media_downloader.download_all(tasks, video_workers=1)
+        assert [os.path.basename(f) for f in downloaded] == ["v0.mp4", "v1.mp4", "v2.mp4", "v3.mp4"]
+        assert sorted(os.listdir(tempdir)) == ["v0.mp4", "v1.mp4", "v2.mp4", "v3.mp4"]
+    assert len(instances) == 1
+
+
+def test_cache_skips_downloaded_files_links_duplicates_and_resumes():
+    requests_seen = []
+    content = b"0123456789" * 10
+
+    def fake_get(url, params):
+        requests_seen.append(url)
+        return FakeResponse(content=content, headers={"Content-Type": "image/jpeg", "ETag": "e1"})
+
+    class RangeSession(FakeSession):
+        def get(self, url, params=None, headers=None, **kwargs):
+            requests_seen.append((url, headers.get("Range"), headers.get("If-Range")))
+            if "Range" not in headers:
+                return FakeResponse(content=content, headers={"Content-Type": "image/jpeg"})
+            start = int(headers["Range"][len("bytes=") : -1])
+            return FakeResponse(
+                content=content[start:],
+                status_code=206,
+                headers={"Content-Type": "image/jpeg", "Content-Range": f"bytes {start}-99/100"},
+            )
+
+    vks = VkScraper("", "", token="token", transport=HttpTransport(session=FakeSession(fake_get)))
+    results = [
+        {"id": "wall-1_1", "attachments": {"photo": ["https://cdn/a.jpg"]}},
+        {"id": "wall-1_2", "attachments": {"photo": ["https://cdn/a.jpg?sign=2"]}},
+    ]
+    with tempfile.TemporaryDirectory() as tempdir:
+        vks.download_media(results, tempdir, photo_workers=1, cache=True)
+        assert len(requests_seen) == 2
+        first, second = (os.path.join(tempdir, f"wall-1_{i}_0.jpg") for i in (1, 2))
+        # identical content is stored once
+        assert os.stat(first).st_ino == os.stat(second).st_ino
+
+        # a re-run downloads nothing
+        vks.download_media(results, tempdir, cache=True)
+        assert len(requests_seen) == 2
+
+        # an interrupted download is resumed where it stopped, if it started from the same remote file
+        part_filename = os.path.join(tempdir, "photo-1_3_0.jpg.part")
+        manifest = DownloadManifest(os.path.join(tempdir, VkScraper.MANIFEST_FILENAME))
+        manifest.record_partial(part_filename, "https://cdn/b.jpg", "e1", None)
+        manifest.save()
+        with open(part_filename, "wb") as f:
+            f.write(content[:40])
+        vks.transport = HttpTransport(session=RangeSession(None))
+        resumed = [{"id": "photo-1_3", "attachments": {"photo": ["https://cdn/b.jpg"]}}]
+        downloaded = vks.download_media(resumed, tempdir, cache=True)
+        assert requests_seen[-1] == ("https://cdn/b.jpg", "bytes=40-", "e1")
+        with open(downloaded[0], "rb") as f:
+            assert f.read() == content
+
+        # without recorded validators, eg: after a kill, the .part file is started over
+        os.remove(downloaded[0])
+        with open(part_filename, "wb") as f:
+            f.write(b"changed on the server")
+        downloaded = vks.download_media(resumed, tempdir, cache=True)
+        assert requests_seen[-1] == ("https://cdn/b.jpg", None, None)
+        with open(downloaded[0], "rb") as f:
+            assert f.read() == content
+
+
+class RangeServer(FakeSession):
+    """Serves content, honoring Range headers unless supports_ranges is False"""
+
+    def __init__(self, content, supports_ranges=True):
+        self.content = content
+        self.supports_ranges = supports_ranges
+        self.ranges = []
+
+    def get(self, url, params=None, headers=None, **kwargs):
+        requested = (headers or {}).get("Range")
+        self.ranges.append(requested)
+        response_headers = {"Content-Type": "image/jpeg"}
+        if requested is None or not self.supports_ranges:
+            return FakeResponse(content=self.content, headers=response_headers)
+        start, end = requested[len("bytes=") :].split("-")
+        end = int(end) if end else len(self.content) - 1
+        response_headers["Content-Range"] = f"bytes {start}-{end}/{len(self.content)}"
+        return FakeResponse(
+            content=self.content[int(start) : end + 1], status_code=206, headers=response_headers
+        )
+
+
+def test_segmented_photos_are_downloaded_in_ranges_or_single_stream():
+    content = bytes(range(256)) * 4
+    segmented = {"photo": SegmentedDownload(segments=3, min_size=1000)}
+    with tempfile.TemporaryDirectory() as tempdir:
+        for size, supports_ranges, expected_ranges in [
+            (1024, True, ["bytes=0-", "bytes=342-683", "bytes=684-1023"]),
+            (1024, False, ["bytes=0-"]),  # the server ignored the range
+            (999, True, ["bytes=0-"]),  # too small to be split
+        ]:
+            server = RangeServer(content[:size], supports_ranges)
+            metrics = Metrics()
+            downloader = MediaDownloader(
+                HttpTransport(session=server), chunk_size=100, metrics=metrics, segmented=segmented
+            )
+            filename = os.path.join(tempdir, f"{size}_{supports_ranges}.jpg")
+            assert downloader.download("photo", "https://cdn/a.jpg", filename) == filename
+            assert sorted(server.ranges) == expected_ranges
+            with open(filename, "rb") as f:
+                assert f.read() == content[:size]
+            segments = metrics.snapshot()["counters"].get("download_segments")
+            assert segments == (3 if len(expected_ranges) > 1 else None)
+        assert not [name for name in os.listdir(tempdir) if name.endswith(".part")]
+
+
+def test_segmented_videos_download_direct_files_and_leave_streams_to_yt_dlp(monkeypatch):
+    processed = []
+
+    class FakeYoutubeDL:
+        def __init__(self, params):
+            self.params = {**params, "outtmpl": {"default": params["outtmpl"]}}
+
+        def extract_info(self, url, download):
+            assert not download
+            if url.endswith("hls"):
+                return {"ext": "mp4", "protocol": "m3u8_native", "url": "https://cdn/v.m3u8"}
+            return {"ext": "mp4", "protocol": "https", "url": "https://cdn/v.mp4"}
+
+        def process_ie_result(self, info, download):
+            processed.append(info["url"])
+            with open(self.prepare_filename(info), "wb") as f:
+                f.write(b"hls")
+            return info
+
+        def prepare_filename(self, info):
+            return self.params["outtmpl"]["default"].replace("%(ext)s", info["ext"])
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr("yt_dlp.YoutubeDL", FakeYoutubeDL)
+    server = RangeServer(b"v" * 5000)
+    downloader = MediaDownloader(
+        HttpTransport(session=server), segmented={"video": SegmentedDownload(2, min_size=0)}
+    )
+    with tempfile.TemporaryDirectory() as tempdir:
+        tasks = [
+            ("video", url, os.path.join(tempdir, f"{name}.%(ext)s"))
+            for name, url in (("direct", "https://vk.com/video-1_1"), ("hls", "https://vk.com/hls"))
+        ]
+        downloaded = downloader.download_all(tasks)
+        assert [os.path.basename(f) for f in downloaded] == ["direct.mp4", "hls.mp4"]
+        assert os.path.getsize(downloaded[0]) == 5000
+    assert sorted(server.ranges) == ["bytes=0-", "bytes=2500-4999"]
+    assert processed == ["https://cdn/v.m3u8"]
+
+
+def test_failed_video_is_left_out_without_aborting_other_downloads(monkeypatch):
+    import yt_dlp
+
+    class FakeYoutubeDL:
+        def __init__(self, params):
+            self.params = {**params, "outtmpl": {"default": params["outtmpl"]}}
+
+        def extract_info(self, url, download):
+            raise yt_dlp.utils.DownloadError("ERROR: This video is private")
+
+        def close(self):
+            pass
+
+    def fake_get(url, params):
+        return FakeResponse(content=b"photo", headers={"Content-Type": "image/jpeg"})
+
+    monkeypatch.setattr("yt_dlp.YoutubeDL", FakeYoutubeDL)
+    vks = VkScraper.from_token("token", transport=HttpTransport(session=FakeSession(fake_get)))
+    results = [
+        {"id": "wall-1_1", "attachments": {"video": ["https://vk.com/video-1_2"]}},
+        {"id": "wall-1_2", "attachments": {"photo": ["https://cdn/a.jpg"]}},
+    ]
+    with tempfile.TemporaryDirectory() as tempdir:
+        downloaded = vks.download_media(results, tempdir)
+        assert [os.path.basename(f) for f in downloaded] == ["wall-1_2_0.jpg"]
+    assert vks.metrics.snapshot()["counters"]["download_errors{kind=video}"] == 1
@@ -0,0 +1,65 @@
+import os
+import tempfile
+
+from vk_url_scraper import extract_ids, extract_ids_from_file, extractor
+from vk_url_scraper.extractor import iter_ids
+
+
+def test_extract_ids_single_pass_normalised_and_deduplicated():
+    text = (
+        "https://vk.com/wall-1_2 https://vk.com/feed?w=wall-1_2 "
+        "https://vk.com/apiclub?z=photo-1_457242435%2Falbum-1_00%2Frev "
+        "vk.com/video38556806_456251917?list=ba2b vk.com/video38556806_456251917_abc123 "
+        "vk.com/wall12_3"
+    )
+    ids = extract_ids(text)
+    assert [i.id for i in ids] == [
+        "wall-1_2",
+        "photo-1_457242435",
+        "video38556806_456251917",
+        "wall12_3",
+    ]
+    assert ids[2].access_key == "abc123"
+    assert ids[2].full_id == "video38556806_456251917_abc123"
+    assert ids[0].owner_id == -1 and ids[0].item_id == 2
+    assert text[ids[1].start : ids[1].end] == "photo-1_457242435"
+    assert [i.id for i in extract_ids(text, {"wall"})] == ["wall-1_2", "wall12_3"]
+    assert extract_ids("vk.com/wall vk.com/photo google.com") == []
+
+
+def test_extract_ids_from_file_handles_chunk_boundaries():
+    lines = [f"message {i}: https://vk.com/wall-1_{i % 50} see photo1_{i}" for i in range(200)]
+    with tempfile.TemporaryDirectory() as tempdir:
+        filename = os.path.join(tempdir, "dump.txt")
+        with open(filename, "w") as f:
+            f.write("\n".join(lines))
+        with open(filename) as f:
+            text = f.read()
+        ids = list(extract_ids_from_file(filename, chunk_size=7))
+    assert [i.id for i in ids] == [i.id for i in extract_ids(text)]
+    assert len(ids) == 250
+    assert all(text[i.start : i.end].endswith(f"{i.owner_id}_{i.item_id}") for i in ids)
+
+
+def test_extract_ids_from_file_handles_text_without_whitespace(monkeypatch):
+    # minified JSON export, ids are only separated by quotes, commas and escaped slashes
+    text = ",".join(
+        f'{{"u":"https:\\/\\/vk.com\\/photo-1_{i}","w":"z=video{i}_1"}}' for i in range(100)
+    )
+    text += "A" * 2000 + "wall-1_2"
+    with tempfile.TemporaryDirectory() as tempdir:
+        filename = os.path.join(tempdir, "dump.json")
+        with open(filename, "w") as f:
+            f.write(text)
+        scanned = []
+        monkeypatch.setattr(
+            extractor,
+            "iter_ids",
+            lambda text, offset=0: scanned.append(text) or iter_ids(text, offset),
+        )
+        ids = list(extract_ids_from_file(filename, chunk_size=5))
+        monkeypatch.undo()
+    assert [i.id for i in ids] == [i.id for i in extract_ids(text)]
+    assert len(ids) == 201
+    # the file is not carried over whole to the end for want of whitespace
+    assert max(map(len, scanned)) <= 5 + extractor.MAX_TAIL
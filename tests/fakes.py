@@ -0,0 +1,40 @@
+import json
+
+import requests
+
+
+class FakeSession:
+    def __init__(self, handler):
+        self.handler = handler
+
+    def get(self, url, params=None, **kwargs):
+        return self.handler(url, params)
+
+    def post(self, url, data=None, **kwargs):
+        return self.handler(url, data)
+
+
+class FakeResponse:
+    def __init__(self, data=None, content=b"", status_code=200, headers=None):
+        self.data = data
+        # API responses are decoded from the body
+        self.content = content or (json.dumps(data).encode() if data is not None else b"")
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def json(self):
+        return self.data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error")
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i : i + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
@@ -0,0 +1,32 @@
+import subprocess
+import sys
+
+# cumulative import time of the package, measured at ~0.15s on a laptop, heavy dependencies like yt_dlp
+# and vk_api would add about as much again: keep them out of the import path
+IMPORT_TIME_BUDGET = 0.5
+LAZY_MODULES = ["yt_dlp", "vk_api"]
+
+
+def run_python(code):
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True
+    )
+
+
+def test_heavy_dependencies_are_imported_lazily():
+    proc = run_python(
+        "import sys, vk_url_scraper, vk_url_scraper.__main__; "
+        f"print([m for m in {LAZY_MODULES!r} if m in sys.modules])"
+    )
+    assert proc.stdout.strip() == "[]"
+
+
+def test_import_time_budget():
+    proc = run_python("import vk_url_scraper")
+    # stderr lines look like "import time:  self [us] | cumulative | imported package"
+    timings = {
+        line.split("|")[2].strip(): int(line.split("|")[1])
+        for line in proc.stderr.splitlines()
+        if line.startswith("import time:") and line.split("|")[1].strip().isdigit()
+    }
+    assert timings["vk_url_scraper"] / 1e6 < IMPORT_TIME_BUDGET
@@ -0,0 +1,117 @@
+import logging
+from contextlib import contextmanager
+
+from vk_url_scraper import HttpTransport, MemoryCache, Metrics, VkScraper
+
+from .fakes import FakeResponse, FakeSession
+
+
+def test_counters_stages_listeners_and_spans():
+    spans, events = [], []
+
+    class FakeTracer:
+        @contextmanager
+        def start_as_current_span(self, name, attributes=None):
+            spans.append((name, attributes))
+            yield
+
+    metrics = Metrics(tracer=FakeTracer(), listeners=[lambda *event: events.append(event)])
+    metrics.count("api_requests", method="wall.getById")
+    metrics.count("api_requests", 2, method="wall.getById")
+    with metrics.stage("api_request", method="video.get"):
+        pass
+
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"] == {"api_requests{method=wall.getById}": 3}
+    assert snapshot["stages"]["api_request{method=video.get}"]["count"] == 1
+    assert spans == [("vk_url_scraper.api_request", {"method": "video.get"})]
+    assert [(name, labels) for name, _, labels in events] == [
+        ("api_request", {"method": "video.get"})
+    ]
+
+
+def test_prometheus_export():
+    metrics = Metrics()
+    metrics.count("cache_hits", 5)
+    metrics.count("api_errors", code=6)
+    metrics.count("api_bytes", 1234567)
+    metrics.observe("download", 0.5, kind="photo")
+    metrics.observe("download", 1.5, kind="photo")
+    metrics.observe("api_request", 0.25)
+
+    assert metrics.to_prometheus().splitlines() == [
+        "# HELP vk_url_scraper_api_bytes_total Bytes of API responses",
+        "# TYPE vk_url_scraper_api_bytes_total counter",
+        "vk_url_scraper_api_bytes_total 1234567",
+        "# HELP vk_url_scraper_api_errors_total API responses with an error, by error code",
+        "# TYPE vk_url_scraper_api_errors_total counter",
+        'vk_url_scraper_api_errors_total{code="6"} 1',
+        "# HELP vk_url_scraper_cache_hits_total API items served by the response cache",
+        "# TYPE vk_url_scraper_cache_hits_total counter",
+        "vk_url_scraper_cache_hits_total 5",
+        "# HELP vk_url_scraper_stage_seconds Duration of the stages of the scraper",
+        "# TYPE vk_url_scraper_stage_seconds summary",
+        'vk_url_scraper_stage_seconds_sum{stage="api_request"} 0.25',
+        'vk_url_scraper_stage_seconds_count{stage="api_request"} 1',
+        'vk_url_scraper_stage_seconds_sum{stage="download",kind="photo"} 2',
+        'vk_url_scraper_stage_seconds_count{stage="download",kind="photo"} 2',
+    ]
+
+
+def test_scraper_records_its_hot_path(caplog):
+    throttled = []
+
+    def fake_get(url, params):
+        if url.endswith("wall.getById"):
+            post = {
+                "owner_id": -1,
+                "id": 1,
+                "date": 0,
+                "attachments": [{"type": "video", "video": {"owner_id": -1, "id": 9}}],
+            }
+            return FakeResponse({"response": {"items": [post]}})
+        if not throttled:
+            throttled.append(True)
+            return FakeResponse({"error": {"error_code": 6, "error_msg": "Too many requests"}})
+        return FakeResponse({"response": {"items": []}})
+
+    vks = VkScraper(
+        "",
+        "",
+        token="token",
+        transport=HttpTransport(session=FakeSession(fake_get)),
+        cache=MemoryCache(),
+        requests_per_second=None,
+    )
+    vks.RETRY_BACKOFF = 0
+    with caplog.at_level(logging.WARNING, logger="vk_url_scraper"):
+        vks.scrape_wall_ids(["wall-1_1"])
+        vks.scrape_wall_ids(["wall-1_1"])
+
+    counters = vks.metrics.snapshot()["counters"]
+    assert counters["api_requests{method=wall.getById}"] == 1
+    assert counters["api_requests{method=video.get}"] == 3
+    assert counters["api_errors{code=6}"] == 1
+    assert counters["throttled"] == 1 and counters["retries"] == 1
+    assert counters["cache_hits"] == 1 and counters["cache_misses"] == 3
+    assert counters["api_bytes"] > 0
+    stages = vks.metrics.snapshot()["stages"]
+    assert stages["parse_walls"]["count"] == 2
+    assert stages["json_decode{method=wall.getById}"]["count"] == 1
+    assert "could not get video player for video-1_9" in caplog.text
+
+
+def test_api_errors_without_error_code_are_counted_as_unknown():
+    def fake_get(url, params):
+        return FakeResponse({"error": {"error_msg": "boom"}})
+
+    vks = VkScraper(
+        "",
+        "",
+        token="token",
+        transport=HttpTransport(session=FakeSession(fake_get)),
+        requests_per_second=None,
+    )
+    vks.scrape_photo_ids(["photo-1_1"])
+    assert vks.metrics.snapshot()["counters"]["api_errors{code=unknown}"] == 1
+    assert 'api_errors_total{code="unknown"} 1' in vks.metrics.to_prometheus()
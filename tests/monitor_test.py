@@ -0,0 +1,130 @@
+import json
+import re
+
+from vk_url_scraper import HttpTransport, VkScraper, WallMonitor
+from vk_url_scraper import __main__ as cli
+
+from .fakes import FakeResponse, FakeSession
+
+
+class FakeWalls:
+    """Walls of posts (newest first) answering wall.get, directly or inside execute"""
+
+    def __init__(self, walls):
+        self.walls = walls
+        self.requests = []
+
+    def post(self, owner_id, post_id, pinned=False):
+        post = {"owner_id": owner_id, "id": post_id, "date": post_id, "text": f"post {post_id}"}
+        if pinned:
+            post["is_pinned"] = 1
+        return post
+
+    def publish(self, owner_id, *post_ids):
+        pinned = [p for p in self.walls[owner_id] if p.get("is_pinned")]
+        regular = [p for p in self.walls[owner_id] if not p.get("is_pinned")]
+        new = [self.post(owner_id, post_id) for post_id in sorted(post_ids, reverse=True)]
+        self.walls[owner_id] = pinned + new + regular
+
+    def wall_get(self, params):
+        owner_id, offset, count = (int(params[k]) for k in ("owner_id", "offset", "count"))
+        if owner_id not in self.walls:
+            return {"error": {"error_code": 15, "error_msg": "Access denied"}}
+        items = self.walls[owner_id][offset : offset + count]
+        return {"response": {"count": len(self.walls[owner_id]), "items": items}}
+
+    def __call__(self, url, params):
+        method = url.rsplit("/", 1)[1]
+        self.requests.append(method)
+        if method == "wall.get":
+            return FakeResponse(self.wall_get(params))
+        response, errors = [], []
+        for sub_method, sub_params in re.findall(r"API\.([\w.]+)\((\{.*?\})\)", params["code"]):
+            sub_res = self.wall_get(json.loads(sub_params))
+            if "error" in sub_res:
+                response.append(False)
+                errors.append({"method": sub_method, **sub_res["error"]})
+            else:
+                response.append(sub_res["response"])
+        return FakeResponse({"response": response, "execute_errors": errors})
+
+
+def make_scraper(fake):
+    return VkScraper.from_token(
+        "token", transport=HttpTransport(session=FakeSession(fake)), requests_per_second=None
+    )
+
+
+def test_poll_returns_only_posts_newer_than_the_mark():
+    fake = FakeWalls({-1: [], -2: []})
+    fake.walls[-1] = [fake.post(-1, 2), fake.post(-1, 1)]
+    monitor = WallMonitor(make_scraper(fake), [-1, -2])
+
+    assert monitor.poll() == []
+    assert monitor.state == {
+        "-1": {"last_id": 2, "last_date": 2},
+        "-2": {"last_id": 0, "last_date": None},
+    }
+    assert fake.requests == ["execute"]
+
+    fake.publish(-1, 3, 4)
+    fake.publish(-2, 7)
+    res = monitor.poll()
+    assert [r["id"] for r in res] == ["wall-1_3", "wall-1_4", "wall-2_7"]
+    assert monitor.state["-1"]["last_id"] == 4
+    assert monitor.poll() == []
+
+
+def test_poll_paginates_past_pinned_post_and_stops_at_max_pages():
+    fake = FakeWalls({-1: []})
+    fake.walls[-1] = [fake.post(-1, 1, pinned=True), fake.post(-1, 2)]
+    monitor = WallMonitor(make_scraper(fake), [-1], page_size=2, use_execute=False)
+    monitor.poll()
+
+    fake.publish(-1, 3, 4, 5)
+    fake.requests.clear()
+    assert [r["id"] for r in monitor.poll()] == ["wall-1_3", "wall-1_4", "wall-1_5"]
+    # pinned + 5, 4 + 3, then 2 is older than the mark
+    assert fake.requests == ["wall.get"] * 3
+
+    monitor.max_pages = 1
+    fake.publish(-1, 6, 7, 8)
+    assert [r["id"] for r in monitor.poll()] == ["wall-1_8"]
+    assert monitor.state["-1"]["last_id"] == 8
+
+
+def test_state_file_is_shared_between_runs_and_errors_are_skipped(tmp_path):
+    state_file = str(tmp_path / "state.json")
+    fake = FakeWalls({-1: []})
+    fake.walls[-1] = [fake.post(-1, 3), fake.post(-1, 2), fake.post(-1, 1)]
+
+    first = WallMonitor(make_scraper(fake), [-1, -404], state_file, backfill=2)
+    assert [r["id"] for r in first.poll()] == ["wall-1_2", "wall-1_3"]
+
+    fake.publish(-1, 4)
+    second = WallMonitor(make_scraper(fake), [-1], state_file)
+    assert [r["id"] for r in second.poll()] == ["wall-1_4"]
+    with open(state_file) as f:
+        assert json.load(f) == {"-1": {"last_id": 4, "last_date": 4}}
+
+
+def test_monitor_subcommand_prints_new_posts(monkeypatch, capsys, tmp_path):
+    fake = FakeWalls({-1: []})
+    fake.walls[-1] = [fake.post(-1, 1)]
+    owners_file = tmp_path / "owners.txt"
+    owners_file.write_text("-1\n\n")
+    from_token = VkScraper.from_token
+    monkeypatch.setattr(
+        cli.VkScraper,
+        "from_token",
+        lambda token, api_version: from_token(
+            token, api_version, transport=HttpTransport(session=FakeSession(fake))
+        ),
+    )
+    argv = ["vk_url_scraper", "monitor", "-t", "token", "--owners-file", str(owners_file)]
+    argv += ["--state", str(tmp_path / "state.json"), "--cycles", "1", "--backfill", "1"]
+    monkeypatch.setattr("sys.argv", argv)
+    cli.main()
+
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line)["id"] for line in lines] == ["wall-1_1"]
@@ -0,0 +1,262 @@
+import itertools
+import json
+import re
+
+import pytest
+
+from vk_url_scraper import HttpTransport, VkScraper, dumps
+from vk_url_scraper.ratelimit import TokenBucket
+
+from .fakes import FakeResponse, FakeSession
+
+
+def make_wall_post(post_id, video_ids):
+    return {
+        "owner_id": -1,
+        "id": post_id,
+        "date": 0,
+        "text": f"post {post_id}",
+        "attachments": [
+            {"type": "video", "video": {"owner_id": -1, "id": video_id}} for video_id in video_ids
+        ],
+    }
+
+
+def test_wall_videos_are_resolved_in_one_call():
+    calls = []
+    posts = [make_wall_post(i, [10 * i + j for j in range(4)]) for i in range(1, 51)]
+
+    def fake_get(url, params):
+        calls.append((url, params))
+        if url.endswith("wall.getById"):
+            return FakeResponse({"response": {"items": posts}})
+        videos = [v.replace("video", "") for v in params["videos"].split(",")]
+        items = [
+            {"owner_id": int(v.split("_")[0]), "id": int(v.split("_")[1]), "player": f"p{v}"}
+            for v in videos
+        ]
+        return FakeResponse({"response": {"items": items}})
+
+    vks = VkScraper("", "", token="token", transport=HttpTransport(session=FakeSession(fake_get)))
+    res = vks.scrape_wall_ids([f"wall-1_{i}" for i in range(1, 51)])
+
+    assert [url.rsplit("/", 1)[1] for url, _ in calls] == ["wall.getById", "video.get"]
+    assert [r["id"] for r in res] == [f"wall-1_{i}" for i in range(1, 51)]
+    assert res[1]["attachments"]["video"] == [f"p-1_{20 + j}" for j in range(4)]
+
+
+def test_video_resolution_lazy_and_none_skip_video_lookups():
+    calls = []
+    posts = [make_wall_post(i, [10 * i, 10 * i + 1]) for i in range(1, 4)]
+
+    def fake_get(url, params):
+        calls.append(url.rsplit("/", 1)[1])
+        if url.endswith("wall.getById"):
+            return FakeResponse({"response": {"items": posts}})
+        videos = params["videos"].split(",")
+        items = [{"owner_id": -1, "id": int(v.split("_")[1]), "player": f"p{v}"} for v in videos]
+        return FakeResponse({"response": {"items": items}})
+
+    vks = VkScraper.from_token(
+        "token",
+        transport=HttpTransport(session=FakeSession(fake_get)),
+        video_resolution="none",
+    )
+    res = vks.scrape_wall_ids([f"wall-1_{i}" for i in range(1, 4)])
+    assert calls == ["wall.getById"]
+    assert res[0]["attachments"]["video"] == [
+        "https://vk.com/video-1_10",
+        "https://vk.com/video-1_11",
+    ]
+
+    # videos with an access key do not cost a video.get call either, the key is dropped
+    posts[2]["attachments"][1]["video"]["access_key"] = "key"
+    calls.clear()
+    res = vks.scrape_wall_ids(["wall-1_3"])
+    assert calls == ["wall.getById"]
+    assert res[0]["attachments"]["video"] == [
+        "https://vk.com/video-1_30",
+        "https://vk.com/video-1_31",
+    ]
+
+    calls.clear()
+    res = vks.scrape("vk.com/wall-1_1 vk.com/wall-1_2", video_resolution="lazy")
+    assert calls == ["wall.getById"]
+    assert res[0]["attachments"]["video"].ids == ["-1_10", "-1_11"]
+    # reading any of them looks up the videos of the whole batch at once
+    assert json.loads(dumps(res[1]))["attachments"]["video"] == ["p-1_20", "p-1_21"]
+    assert res[0]["attachments"]["video"] == ["p-1_10", "p-1_11"]
+    assert calls == ["wall.getById", "video.get"]
+
+    with pytest.raises(ValueError):
+        vks.scrape_wall_ids(["wall-1_1"], video_resolution="later")
+
+
+def test_transport_reuses_session_and_applies_timeout():
+    seen = []
+
+    class RecordingSession:
+        def get(self, url, params=None, **kwargs):
+            seen.append(kwargs["timeout"])
+            return FakeResponse({})
+
+    session = RecordingSession()
+    transport = HttpTransport(session=session, timeout=3)
+    vks = VkScraper("", "", token="token", transport=transport)
+    vks.scrape_photo_ids(["photo-1_1"])
+    vks.scrape_video_ids(["video-1_1"])
+    assert vks.transport.session is session
+    assert seen == [3, 3]
+
+
+def test_ids_are_deduplicated_chunked_and_merged_in_order():
+    calls = []
+
+    def fake_get(url, params):
+        calls.append(params["photos"])
+        ids = params["photos"].split(",")
+        # VK does not guarantee the order of items within a call
+        items = [
+            {"owner_id": int(i.split("_")[0]), "id": int(i.split("_")[1]), "orig_photo": {"url": i}}
+            for i in reversed(ids)
+        ]
+        return FakeResponse({"response": items})
+
+    vks = VkScraper(
+        "",
+        "",
+        token="token",
+        transport=HttpTransport(session=FakeSession(fake_get)),
+        max_workers=3,
+    )
+    photo_ids = [f"photo-1_{i}" for i in range(250)] * 2
+    res = vks.scrape_photo_ids(photo_ids)
+
+    assert len(calls) == 3
+    assert sorted(len(c.split(",")) for c in calls) == [50, 100, 100]
+    assert [r["id"] for r in res] == [f"photo-1_{i}" for i in range(250)]
+
+
+def test_execute_coalesces_scrape_calls():
+    calls = []
+
+    def fake_get(url, params):
+        method = url.rsplit("/", 1)[1]
+        calls.append(method)
+        assert method == "execute"
+        sub_calls = re.findall(r"API\.([\w.]+)\((\{.*?\})\)", params["code"])
+        response, errors = [], []
+        for sub_method, sub_params in sub_calls:
+            sub_params = json.loads(sub_params)
+            if sub_method == "wall.getById":
+                response.append({"items": [make_wall_post(2, [])]})
+            elif sub_method == "photos.getById":
+                response.append(False)
+                errors.append({"method": sub_method, "error_code": 15, "error_msg": "denied"})
+            else:
+                owner_id, video_id = sub_params["videos"].split("_")
+                response.append({"items": [{"owner_id": int(owner_id), "id": int(video_id)}]})
+        return FakeResponse({"response": response, "execute_errors": errors})
+
+    vks = VkScraper(
+        "",
+        "",
+        token="token",
+        transport=HttpTransport(session=FakeSession(fake_get)),
+        use_execute=True,
+    )
+    res = vks.scrape("vk.com/wall-1_2 vk.com/photo-1_3 vk.com/video-1_4")
+
+    assert calls == ["execute"]
+    assert [r["id"] for r in res] == ["wall-1_2", "photo-1_3", "video-1_4"]
+    assert res[1]["error"] == {"code": 15, "message": "denied"}
+
+
+def test_throttled_calls_are_retried_and_failures_reported():
+    attempts = []
+
+    def fake_get(url, params):
+        attempts.append(params["photos"])
+        if params["photos"] == "-1_1" and len(attempts) < 3:
+            return FakeResponse({"error": {"error_code": 6, "error_msg": "Too many requests"}})
+        if params["photos"] == "-1_2":
+            return FakeResponse({"error": {"error_code": 6, "error_msg": "Too many requests"}})
+        return FakeResponse({"response": [{"owner_id": -1, "id": 1, "orig_photo": {"url": "u"}}]})
+
+    vks = VkScraper(
+        "",
+        "",
+        token="token",
+        transport=HttpTransport(session=FakeSession(fake_get)),
+        requests_per_second=None,
+        max_retries=3,
+    )
+    vks.RETRY_BACKOFF = 0
+    vks.ID_LIMITS = {"photos.getById": 1}
+
+    res = vks.scrape_photo_ids(["photo-1_1", "photo-1_2"])
+    assert res[0]["id"] == "photo-1_1" and "error" not in res[0]
+    assert res[1]["id"] == "photo-1_2"
+    assert res[1]["error"] == {"code": 6, "message": "Too many requests"}
+    assert attempts.count("-1_2") == 4
+
+
+def test_token_bucket_paces_calls():
+    now = [0.0]
+    waits = []
+
+    def sleep(seconds):
+        waits.append(seconds)
+        now[0] += seconds
+
+    bucket = TokenBucket(rate=3, clock=lambda: now[0], sleep=sleep)
+    for _ in range(6):
+        bucket.acquire()
+    assert waits == pytest.approx([1 / 3, 1 / 3, 1 / 3])
+
+
+def test_scrape_iter_streams_batches_lazily():
+    consumed = []
+    requested = []
+
+    def texts():
+        for i in itertools.count():
+            consumed.append(i)
+            yield f"see https://vk.com/photo-1_{i} and vk.com/photo-1_{i}"
+
+    def fake_get(url, params):
+        requested.append(params["photos"])
+        items = [
+            {"owner_id": -1, "id": int(i.split("_")[1]), "orig_photo": {"url": i}}
+            for i in params["photos"].split(",")
+        ]
+        return FakeResponse({"response": items})
+
+    vks = VkScraper("", "", token="token", transport=HttpTransport(session=FakeSession(fake_get)))
+    results = vks.scrape_iter(texts(), batch_size=10)
+    first = [next(results) for _ in range(6)]
+
+    assert [r["id"] for r in first] == [f"photo-1_{i}" for i in range(6)]
+    assert len(consumed) == 10
+    # repeated ids do not count towards the batch size
+    assert requested == [",".join(f"-1_{i}" for i in range(10))]
+
+
+def test_from_token_skips_vk_api_session(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    seen = []
+
+    def fake_get(url, params):
+        seen.append(params)
+        photo = {"id": 1, "owner_id": -1, "date": 0, "orig_photo": {"url": "u"}}
+        return FakeResponse({"response": [photo]})
+
+    vks = VkScraper.from_token(
+        "token", "5.131", transport=HttpTransport(session=FakeSession(fake_get)), max_retries=1
+    )
+    assert [r["id"] for r in vks.scrape_photo_ids(["photo-1_1"])] == ["photo-1_1"]
+    assert (seen[0]["access_token"], seen[0]["v"]) == ("token", "5.131")
+    assert vks.max_retries == 1
+    assert list(tmp_path.iterdir()) == []  # no vk_config.v2.json
+    with pytest.raises(ValueError):
+        VkScraper.from_token("token", result_type="unknown")
@@ -0,0 +1,42 @@
+import json
+import sys
+
+import pytest
+
+from vk_url_scraper import DateTimeEncoder, HttpTransport, ScrapeResult, VkScraper
+
+from .fakes import FakeResponse, FakeSession
+
+
+def fake_get(url, params):
+    item = {"owner_id": -1, "id": 1, "date": 0, "text": "hi", "likes": {"count": 3}, "views": 7}
+    return FakeResponse({"response": {"items": [item]}})
+
+
+def make_scraper(**kwargs):
+    return VkScraper(
+        "", "", token="token", transport=HttpTransport(session=FakeSession(fake_get)), **kwargs
+    )
+
+
+def test_compact_results_with_raw_payload():
+    res = make_scraper(result_type="compact", payload="raw").scrape_wall_ids(["wall-1_1"])
+    record = res[0]
+    assert isinstance(record, ScrapeResult)
+    assert not hasattr(record, "__dict__")
+    assert record["id"] == record.id == "wall-1_1"
+    assert record["attachments"] == {}
+    assert isinstance(record.raw_payload, bytes)
+    assert record.payload["likes"] == {"count": 3}
+    assert "error" not in record
+    assert json.loads(json.dumps(record, cls=DateTimeEncoder))["payload"]["views"] == 7
+    assert sys.getsizeof(record) < sys.getsizeof(record.to_dict())
+
+
+def test_payload_projection_and_dropping():
+    res = make_scraper(payload=["likes"]).scrape_wall_ids(["wall-1_1"])
+    assert res[0]["payload"] == {"likes": {"count": 3}}
+    res = make_scraper(result_type="compact", payload="none").scrape_wall_ids(["wall-1_1"])
+    assert res[0].payload == {} and res[0].text == "hi"
+    with pytest.raises(ValueError):
+        make_scraper(payload="raw")
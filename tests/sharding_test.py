@@ -0,0 +1,88 @@
+import json
+import multiprocessing
+
+import pytest
+
+from vk_url_scraper import HttpTransport, VkScraper, sharding
+from vk_url_scraper.sharding import run_sharded
+
+from .fakes import FakeResponse, FakeSession
+
+
+def fake_photos(url, params):
+    ids = params["photos"].split(",")
+    if params["access_token"] == "crash" and "-1_13" in ids:
+        raise RuntimeError("worker crashed")
+    items = [
+        {"owner_id": -1, "id": int(i.split("_")[1]), "orig_photo": {"url": params["access_token"]}}
+        for i in ids
+    ]
+    return FakeResponse({"response": items})
+
+
+def make_scraper(token):
+    return VkScraper.from_token(
+        token, transport=HttpTransport(session=FakeSession(fake_photos)), requests_per_second=None
+    )
+
+
+def write_input(tmp_path, ids):
+    input_file = tmp_path / "urls.txt"
+    # every id appears twice to check that they are only scraped once
+    input_file.write_text("".join(f"https://vk.com/photo-1_{i} photo-1_{i}\n" for i in ids * 2))
+    return str(input_file)
+
+
+def read_ids(filename):
+    with open(filename) as f:
+        return [json.loads(line)["id"] for line in f]
+
+
+def test_shards_are_merged_in_order_and_deduplicated(tmp_path):
+    input_file = write_input(tmp_path, list(range(20)))
+    output = str(tmp_path / "out.ndjson")
+
+    written = run_sharded(
+        input_file, output, ["a", "b"], batch_size=3, scraper_factory=make_scraper
+    )
+
+    assert written == 20
+    assert read_ids(output) == [f"photo-1_{i}" for i in range(20)]
+    with open(output) as f:
+        tokens = {json.loads(line)["attachments"]["photo"][0] for line in f}
+    assert tokens <= {"a", "b"}
+
+
+def test_crashed_run_resumes_from_checkpoint(tmp_path):
+    input_file = write_input(tmp_path, list(range(20)))
+    output = str(tmp_path / "out.ndjson")
+
+    with pytest.raises(RuntimeError):
+        run_sharded(input_file, output, ["crash"], batch_size=5, scraper_factory=make_scraper)
+    assert read_ids(output) == [f"photo-1_{i}" for i in range(10)]
+    # leftovers of a write interrupted after the last checkpoint are dropped
+    with open(output, "a") as f:
+        f.write('{"id": "photo-1_1')
+
+    written = run_sharded(input_file, output, ["a"], batch_size=5, scraper_factory=make_scraper)
+
+    assert written == 10
+    assert read_ids(output) == [f"photo-1_{i}" for i in range(20)]
+
+
+def test_checkpoint_of_another_run_is_rejected(tmp_path):
+    input_file = write_input(tmp_path, [1])
+    output = str(tmp_path / "out.ndjson")
+    run_sharded(input_file, output, ["a"], batch_size=5, scraper_factory=make_scraper)
+    with pytest.raises(ValueError):
+        run_sharded(input_file, output, ["a"], batch_size=10, scraper_factory=make_scraper)
+
+
+def test_replacement_workers_get_a_token_round_robin(monkeypatch):
+    monkeypatch.setattr(sharding, "_worker_scraper", None)
+    started = multiprocessing.Value("i", 0)
+    used = []
+    # a pool restarting dead workers calls the initializer more times than it has processes
+    for _ in range(3):
+        sharding._init_worker(started, ["a", "b"], used.append)
+    assert used == ["a", "b", "a"]
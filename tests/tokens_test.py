@@ -0,0 +1,94 @@
+import pytest
+
+from vk_url_scraper import HttpTransport, TokenPool, VkScraper
+
+from .fakes import FakeResponse, FakeSession
+
+
+def photo_response(params):
+    items = [
+        {"owner_id": -1, "id": int(i.split("_")[1]), "orig_photo": {"url": i}}
+        for i in params["photos"].split(",")
+    ]
+    return FakeResponse({"response": items})
+
+
+def test_round_robin_spreads_calls_over_tokens():
+    used = []
+
+    def fake_get(url, params):
+        used.append(params["access_token"])
+        return photo_response(params)
+
+    vks = VkScraper.from_tokens(
+        ["token-a", "token-b", "token-c"],
+        requests_per_second=None,
+        transport=HttpTransport(session=FakeSession(fake_get)),
+        max_workers=1,
+    )
+    vks.ID_LIMITS = {"photos.getById": 1}
+    res = vks.scrape_photo_ids([f"photo-1_{i}" for i in range(6)])
+
+    assert len(res) == 6
+    assert used == ["token-a", "token-b", "token-c"] * 2
+    assert [s["calls"] for s in vks.token_pool.stats()] == [2, 2, 2]
+    assert vks.token_pool.stats()[0]["token"] == "...en-a"
+
+
+def test_failing_token_is_benched_and_call_retried_with_another():
+    now = [0.0]
+    used = []
+
+    def fake_get(url, params):
+        used.append(params["access_token"])
+        if params["access_token"] == "bad":
+            return FakeResponse({"error": {"error_code": 5, "error_msg": "authorization failed"}})
+        return photo_response(params)
+
+    pool = TokenPool(["bad", "good"], requests_per_second=None, clock=lambda: now[0])
+    vks = VkScraper.from_token(
+        "bad", transport=HttpTransport(session=FakeSession(fake_get)), token_pool=pool
+    )
+    vks.RETRY_BACKOFF = 0
+
+    assert "error" not in vks.scrape_photo_ids(["photo-1_1"])[0]
+    assert "error" not in vks.scrape_photo_ids(["photo-1_2"])[0]
+    assert used == ["bad", "good", "good"]
+    assert pool.stats()[0]["errors"] == 1 and pool.stats()[0]["throttled"] == 1
+
+    # once the bench is over the token is used again
+    now[0] += TokenPool.BENCH_SECONDS[5]
+    vks.scrape_photo_ids(["photo-1_3"])
+    assert used[-2:] == ["bad", "good"]
+
+
+def test_least_throttled_prefers_tokens_throttled_longest_ago():
+    now = [0.0]
+    pool = TokenPool(
+        ["a", "b"], strategy="least_throttled", requests_per_second=None, clock=lambda: now[0]
+    )
+    a, b = pool.tokens
+    assert pool.acquire() is a
+    pool.report(a, {"error": {"error_code": 6}})
+    assert pool.acquire() is b
+    assert pool.acquire() is b  # a is benched
+    now[0] += 2
+    pool.report(b, {"execute_errors": [{"error_code": 6}]})
+    now[0] += 2
+    assert pool.acquire() is a  # both available, a was throttled first
+
+
+def test_all_benched_uses_the_first_released_token():
+    pool = TokenPool(["a", "b"], requests_per_second=None, clock=lambda: 0.0)
+    a, b = pool.tokens
+    pool.report(a, {"error": {"error_code": 29}})
+    pool.report(b, {"error": {"error_code": 6}})
+    assert pool.acquire() is b
+    assert not pool.can_retry(6)
+
+
+def test_invalid_pools():
+    with pytest.raises(ValueError):
+        TokenPool([])
+    with pytest.raises(ValueError):
+        TokenPool(["a"], strategy="random")
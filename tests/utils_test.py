@@ -0,0 +1,51 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from vk_url_scraper import utils
+from vk_url_scraper.records import ScrapeResult
+from vk_url_scraper.utils import DateTimeEncoder, dumps, loads
+
+
+@pytest.fixture(params=["orjson", "json"])
+def backend(request, monkeypatch):
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(utils, "orjson", None)
+    return request.param
+
+
+def results():
+    when = datetime(2021, 8, 6, 11, 32, 26)
+    return [
+        {"id": "wall1_2", "text": "привет", "datetime": when, "attachments": {}, "payload": {}},
+        ScrapeResult("photo1_3", "", when, {"photo": ["https://a/b.jpg"]}),
+    ]
+
+
+def test_dumps_matches_date_time_encoder(backend):
+    expected = json.loads(json.dumps(results(), cls=DateTimeEncoder))
+    assert loads(dumps(results())) == expected
+    assert loads(dumps(results(), indent=True)) == expected
+    assert '"2021-08-06 11:32:26"' in dumps(results())
+    assert "привет" in dumps(results())
+
+
+def test_dumps_compact_and_indented(backend):
+    assert "\n" not in dumps(results())
+    assert dumps({"a": [1]}, indent=True) == '{\n  "a": [\n    1\n  ]\n}'
+
+
+def test_dumps_iso_datetimes(backend):
+    assert loads(dumps(results(), iso_datetimes=True))[1]["datetime"] == "2021-08-06T11:32:26"
+
+
+def test_dumps_unsupported_type(backend):
+    with pytest.raises(TypeError):
+        dumps({"a": object()})
+
+
+def test_loads_bytes_and_str(backend):
+    assert loads(b'{"response": [1]}') == loads('{"response": [1]}') == {"response": [1]}
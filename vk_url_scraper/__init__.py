@@ -1,2 +1,12 @@
+from .async_scraper import AsyncVkScraper
+from .attachments import LazyVideos
+from .cache import MemoryCache, ResponseCache, SQLiteCache
+from .downloader import SegmentedDownload
+from .extractor import VkId, extract_ids, extract_ids_from_file
+from .metrics import Metrics
+from .monitor import WallMonitor
+from .records import ScrapeResult
 from .scraper import VkScraper
-from .utils import DateTimeEncoder, suppress_stdout
+from .tokens import TokenPool
+from .transport import HttpTransport
+from .utils import DateTimeEncoder, dumps, loads, suppress_stdout
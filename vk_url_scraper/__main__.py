@@ -1,8 +1,14 @@
 import argparse
 import json
+import sys
+from functools import partial
+from typing import Iterator, List
 
+from .monitor import WallMonitor
 from .scraper import VkScraper
-from .utils import DateTimeEncoder
+from .sharding import run_sharded
+from .tokens import TokenSession
+from .utils import DateTimeEncoder, dumps
 
 
 def get_argument_parser():
@@ -10,7 +16,9 @@ def get_argument_parser():
     Creates the CMD line arguments. 'python vk_url_scraper.py --help'
     """
     parser = argparse.ArgumentParser(
-        description="Authenticate and scrape information from vk.com based on a URL or set of URLs."
+        description="Authenticate and scrape information from vk.com based on a URL or set of URLs.",
+        epilog="run 'vk_url_scraper shard --help' to scrape large files with several processes and tokens "
+        "and 'vk_url_scraper monitor --help' to watch walls for new posts",
     )
 
     parser.add_argument(
@@ -49,23 +57,271 @@ def get_argument_parser():
         action="store",
         dest="urls",
         nargs=argparse.REMAINDER,
-        required=True,
+        required=False,
         help="must be the last argument: any text with one or more urls to scrape",
     )
+    parser.add_argument(
+        "-i",
+        "--input",
+        action="store",
+        dest="input",
+        required=False,
+        help="file to read text with urls from, line by line, or - for stdin (can be combined with --urls)",
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        action="store",
+        dest="format",
+        choices=["json", "ndjson"],
+        default="json",
+        help="json: one indented array once everything is scraped, ndjson: one result per line as soon as it is ready",
+    )
+    parser.add_argument(
+        "-b",
+        "--batch-size",
+        action="store",
+        dest="batch_size",
+        type=int,
+        default=100,
+        help="number of ids sent to the API together when reading --input or writing ndjson",
+    )
+    parser.add_argument(
+        "--videos",
+        action="store",
+        dest="video_resolution",
+        choices=["eager", "none"],
+        default="eager",
+        help="eager: player urls of the videos attached to posts (extra API calls), none: their vk.com urls",
+    )
+    return parser
+
+
+def get_shard_argument_parser():
+    """
+    Creates the CMD line arguments of the shard subcommand. 'python vk_url_scraper.py shard --help'
+    """
+    parser = argparse.ArgumentParser(
+        prog="vk_url_scraper shard",
+        description="Scrape every url of a large text file with several processes (one token each) into "
+        "an NDJSON file, re-running the same command resumes an interrupted run.",
+    )
+    parser.add_argument(
+        "-i", "--input", action="store", dest="input", required=True, help="text file with urls"
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        action="store",
+        dest="output",
+        required=True,
+        help="NDJSON file where results are written in input order",
+    )
+    parser.add_argument(
+        "-t",
+        "--token",
+        action="append",
+        dest="tokens",
+        default=[],
+        help="access token, repeat it to use several accounts",
+    )
+    parser.add_argument(
+        "--tokens-file",
+        action="store",
+        dest="tokens_file",
+        help="file with one access token per line, added to the --token ones",
+    )
+    parser.add_argument(
+        "-j",
+        "--processes",
+        action="store",
+        dest="processes",
+        type=int,
+        help="number of worker processes, defaults to one per token",
+    )
+    parser.add_argument(
+        "-b",
+        "--batch-size",
+        action="store",
+        dest="batch_size",
+        type=int,
+        default=100,
+        help="number of ids scraped together by a worker",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        action="store",
+        dest="checkpoint",
+        help="progress file used to resume, defaults to the output file name + .checkpoint",
+    )
+    parser.add_argument(
+        "--api-version",
+        action="store",
+        dest="api_version",
+        default=TokenSession.API_VERSION,
+        help="vk.com API version",
+    )
     return parser
 
 
+def shard_main(argv: List[str]) -> None:
+    parser = get_shard_argument_parser()
+    args = parser.parse_args(argv)
+    tokens = list(args.tokens)
+    if args.tokens_file is not None:
+        with open(args.tokens_file) as f:
+            tokens += [line.strip() for line in f if line.strip()]
+    if not tokens:
+        parser.error("at least one --token or --tokens-file is required")
+    written = run_sharded(
+        args.input,
+        args.output,
+        tokens,
+        processes=args.processes,
+        batch_size=args.batch_size,
+        checkpoint_filename=args.checkpoint,
+        scraper_factory=partial(VkScraper.from_token, api_version=args.api_version),
+    )
+    print(f"{written} results written to {args.output}", file=sys.stderr)
+
+
+def get_monitor_argument_parser():
+    """
+    Creates the CMD line arguments of the monitor subcommand. 'python vk_url_scraper.py monitor --help'
+    """
+    parser = argparse.ArgumentParser(
+        prog="vk_url_scraper monitor",
+        description="Watch the walls of users and communities and print their new posts as NDJSON, "
+        "only posts newer than the ones recorded in the state file are fetched.",
+    )
+    parser.add_argument(
+        "-t", "--token", action="store", dest="token", required=True, help="access token"
+    )
+    parser.add_argument(
+        "-o",
+        "--owner",
+        action="append",
+        dest="owners",
+        type=int,
+        default=[],
+        help="id of a user or community (negative) to watch, repeat it for several walls",
+    )
+    parser.add_argument(
+        "--owners-file",
+        action="store",
+        dest="owners_file",
+        help="file with one owner id per line, added to the --owner ones",
+    )
+    parser.add_argument(
+        "-s",
+        "--state",
+        action="store",
+        dest="state",
+        default="vk_monitor_state.json",
+        help="file where the newest post seen on each wall is kept between runs",
+    )
+    parser.add_argument(
+        "-n",
+        "--interval",
+        action="store",
+        dest="interval",
+        type=float,
+        default=60,
+        help="seconds between polls",
+    )
+    parser.add_argument(
+        "-c",
+        "--cycles",
+        action="store",
+        dest="cycles",
+        type=int,
+        help="number of polls before exiting, defaults to polling forever",
+    )
+    parser.add_argument(
+        "--backfill",
+        action="store",
+        dest="backfill",
+        type=int,
+        default=0,
+        help="latest posts printed for walls seen for the first time",
+    )
+    parser.add_argument(
+        "--api-version",
+        action="store",
+        dest="api_version",
+        default=TokenSession.API_VERSION,
+        help="vk.com API version",
+    )
+    return parser
+
+
+def monitor_main(argv: List[str]) -> None:
+    parser = get_monitor_argument_parser()
+    args = parser.parse_args(argv)
+    owner_ids = list(args.owners)
+    if args.owners_file is not None:
+        with open(args.owners_file) as f:
+            owner_ids += [int(line) for line in f if line.strip()]
+    if not owner_ids:
+        parser.error("at least one --owner or --owners-file is required")
+    vks = VkScraper.from_token(args.token, args.api_version)
+    monitor = WallMonitor(vks, owner_ids, args.state, backfill=args.backfill)
+    for result in monitor.watch(args.interval, args.cycles):
+        print(dumps(result), flush=True)
+
+
+def read_texts(args: argparse.Namespace) -> Iterator[str]:
+    """Yields the text of --urls and then the lines of --input, which is read lazily"""
+    if args.urls:
+        yield " ".join(args.urls)
+    if args.input == "-":
+        yield from sys.stdin
+    elif args.input is not None:
+        with open(args.input, encoding="utf-8", errors="replace") as f:
+            yield from f
+
+
 def main():
+    if sys.argv[1:2] == ["shard"]:
+        shard_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["monitor"]:
+        monitor_main(sys.argv[2:])
+        return
     parser = get_argument_parser()
     args = parser.parse_args()
-    vks = VkScraper(args.username, args.password, args.token)
-    text = " ".join(args.urls)
-    res = vks.scrape(text)
-    res_json = json.dumps(res, ensure_ascii=False, indent=4, cls=DateTimeEncoder)
-    print(res_json)
+    if not args.urls and args.input is None:
+        parser.error("one of --urls or --input is required")
+    vks = VkScraper(
+        args.username, args.password, args.token, video_resolution=args.video_resolution
+    )
+    if args.format == "ndjson":
+        stream_ndjson(vks, read_texts(args), args.batch_size, args.download)
+        return
+    if args.input is None:
+        res = vks.scrape(" ".join(args.urls))
+    else:
+        res = list(vks.scrape_iter(read_texts(args), args.batch_size))
+    # the fast path of dumps only indents with 2 spaces, the json format keeps its 4 spaces
+    print(json.dumps(res, ensure_ascii=False, indent=4, cls=DateTimeEncoder))
     if args.download:
         vks.download_media(res)
 
 
+def stream_ndjson(vks: VkScraper, texts: Iterator[str], batch_size: int, download: bool) -> None:
+    """Prints each result on its own line as soon as its batch is fetched, downloading its media
+    batch by batch when download is set so that memory stays bounded"""
+    pending = []
+    for result in vks.scrape_iter(texts, batch_size):
+        print(dumps(result), flush=True)
+        if download:
+            pending.append(result)
+            if len(pending) >= batch_size:
+                vks.download_media(pending)
+                pending = []
+    if pending:
+        vks.download_media(pending)
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,153 @@
+import asyncio
+from typing import Dict, List, Optional
+
+from .downloader import SegmentedDownload
+from .records import Result
+from .scraper import VkScraper
+
+
+class AsyncVkScraper:
+    """asyncio version of VkScraper, all `scrape*` functions are coroutines returning the same payload as
+    VkScraper (see its class documentation).
+
+    The wall, photo and video lookups of `scrape` run concurrently and `download_media` downloads up to
+    max_concurrent_downloads files at once. HTTP calls are made by the wrapped VkScraper (and so share
+    its connection pool, rate limiter and retries) in worker threads, so they never block the event loop.
+    """
+
+    def __init__(self, scraper: VkScraper, max_concurrent_downloads: int = 8) -> None:
+        """Wraps an authenticated VkScraper, use `AsyncVkScraper.create` to also authenticate without blocking.
+
+        Parameters
+        ----------
+        scraper : VkScraper
+            The scraper doing the API calls and downloads
+        max_concurrent_downloads : int
+            Max number of photos and videos downloaded at the same time by download_media
+        """
+        self.scraper = scraper
+        self.max_concurrent_downloads = max_concurrent_downloads
+
+    @classmethod
+    async def create(
+        cls,
+        username: str,
+        password: str,
+        token: Optional[str] = None,
+        max_concurrent_downloads: int = 8,
+        **kwargs,
+    ) -> "AsyncVkScraper":
+        """Authenticates a VkScraper in a worker thread and wraps it, kwargs are passed on to VkScraper"""
+        scraper = await asyncio.to_thread(VkScraper, username, password, token, **kwargs)
+        return cls(scraper, max_concurrent_downloads)
+
+    async def scrape(self, url: str, video_resolution: Optional[str] = None) -> List[Result]:
+        """Scrapes a URL for multiple possibilities of inner links such as wall, video, photo, ...
+        running the wall, photo and video lookups concurrently.
+
+        Parameters
+        ----------
+        url : str
+            The URL to parse and analyze content from
+        video_resolution : str
+            "eager", "lazy" or "none", see VkScraper, lazy videos are looked up in the thread reading them
+
+        Returns
+        -------
+        a list of dict as specified in the VkScraper class documentation.
+        """
+        if self.scraper.batcher is not None:
+            # lookups are already coalesced into a single execute request
+            return await asyncio.to_thread(self.scraper.scrape, url, video_resolution)
+        walls, photos, videos = await asyncio.gather(
+            self.scrape_walls(url, video_resolution),
+            self.scrape_photos(url),
+            self.scrape_videos(url),
+        )
+        return walls + photos + videos
+
+    async def scrape_walls(self, url: str, video_resolution: Optional[str] = None) -> List[Result]:
+        """Async version of VkScraper.scrape_walls"""
+        return await asyncio.to_thread(self.scraper.scrape_walls, url, video_resolution)
+
+    async def scrape_wall_ids(
+        self,
+        wall_ids: List[str],
+        copy_history_depth: int = 2,
+        video_resolution: Optional[str] = None,
+    ) -> List[Result]:
+        """Async version of VkScraper.scrape_wall_ids"""
+        return await asyncio.to_thread(
+            self.scraper.scrape_wall_ids, wall_ids, copy_history_depth, video_resolution
+        )
+
+    async def scrape_photos(self, url: str) -> List[Result]:
+        """Async version of VkScraper.scrape_photos"""
+        return await asyncio.to_thread(self.scraper.scrape_photos, url)
+
+    async def scrape_photo_ids(self, photo_ids: List[str]) -> List[Result]:
+        """Async version of VkScraper.scrape_photo_ids"""
+        return await asyncio.to_thread(self.scraper.scrape_photo_ids, photo_ids)
+
+    async def scrape_videos(self, url: str) -> List[Result]:
+        """Async version of VkScraper.scrape_videos"""
+        return await asyncio.to_thread(self.scraper.scrape_videos, url)
+
+    async def scrape_video_ids(self, video_ids: List[str]) -> List[Result]:
+        """Async version of VkScraper.scrape_video_ids"""
+        return await asyncio.to_thread(self.scraper.scrape_video_ids, video_ids)
+
+    async def download_media(
+        self,
+        results: List[Result],
+        destination: str = "./output/",
+        photo_workers: int = 8,
+        video_workers: int = 2,
+        max_per_host: int = 4,
+        chunk_size: int = 1024 * 1024,
+        cache: bool = False,
+        segmented: Optional[Dict[str, SegmentedDownload]] = None,
+    ) -> List[str]:
+        """
+        Async version of VkScraper.download_media, downloading up to max_concurrent_downloads files at once
+
+        Parameters
+        ----------
+        results : List[dict]
+            list with valid dictionary results (see VkScraper class definition)
+        destination : str
+            the directory to save the downloaded files to. defaults to output/
+        photo_workers : int
+            max number of photos downloaded at the same time
+        video_workers : int
+            max number of videos downloaded at the same time
+        max_per_host : int
+            max number of concurrent downloads from the same host
+        chunk_size : int
+            photos are streamed to disk in chunks of this many bytes
+        cache : bool
+            keep a manifest of the downloads in the destination folder, see VkScraper.download_media
+        segmented : Dict[str, SegmentedDownload]
+            media types whose large files are downloaded in concurrent byte ranges, see VkScraper.download_media
+
+        Returns
+        -------
+        a list of filenames for the downloaded files, in the same order as the results (failed downloads are left out)
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrent_downloads)
+        workers = {
+            "photo": asyncio.Semaphore(photo_workers),
+            "video": asyncio.Semaphore(video_workers),
+        }
+        with self.scraper.media_downloader(
+            destination, max_per_host, chunk_size, cache, segmented
+        ) as downloader:
+
+            async def download(kind: str, url: str, filename: str) -> Optional[str]:
+                async with semaphore, workers[kind]:
+                    return await asyncio.to_thread(downloader.download, kind, url, filename)
+
+            downloaded = await asyncio.gather(
+                *[download(*task) for task in self.scraper.download_tasks(results, destination)]
+            )
+        return [filename for filename in downloaded if filename is not None]
@@ -0,0 +1,95 @@
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# how the video attachments of wall posts are turned into urls: "eager" (player urls looked up with
+# video.get before returning), "lazy" (looked up on first access, see LazyVideos) or "none" (vk.com urls
+# built from the ids, no API call, their access key is dropped so private videos need "lazy" or "eager")
+VIDEO_RESOLUTIONS = ("eager", "lazy", "none")
+
+
+def video_key(video_id: str) -> str:
+    # drops the optional access key: "-1_2_abcdef" -> "-1_2"
+    return "_".join(video_id.split("_")[:2])
+
+
+def video_page_url(video_id: str) -> str:
+    """vk.com url of a video id like "-1_2", which yt-dlp also downloads from, the access key of private
+    videos is dropped since a page url cannot carry it: those are only playable from their player url
+    """
+    return f"https://vk.com/video{video_key(video_id)}"
+
+
+def players_for(video_ids: List[str], players: Dict[str, str]) -> List[str]:
+    """Player urls of video_ids found in players (from VkScraper._get_video_players), others are skipped"""
+    res = []
+    for video_id in video_ids:
+        player = players.get(video_key(video_id))
+        if player is None:
+            logger.warning(f"could not get video player for video{video_id}")
+            continue
+        res.append(player)
+    return res
+
+
+class VideoResolver:
+    """Looks up the player urls of every video attachment of a batch of wall posts, once, on first need"""
+
+    def __init__(self, get_players: Callable[[List[str]], Dict[str, str]], video_ids: List[str]):
+        self.get_players = get_players
+        self.video_ids = video_ids
+        self.lock = threading.Lock()
+        self.players: Optional[Dict[str, str]] = None
+
+    def resolve(self) -> Dict[str, str]:
+        with self.lock:
+            if self.players is None:
+                self.players = self.get_players(self.video_ids)
+        return self.players
+
+
+class LazyVideos(Sequence[str]):
+    """Video attachments of a wall post, used in place of the list of player urls with lazy resolution.
+
+    It keeps the video ids (see `ids`) and behaves like the list of player urls, which are looked up the
+    first time it is read, with a single video.get lookup for the whole batch of posts it was scraped with.
+    Videos whose player cannot be found are left out, like with eager resolution.
+    """
+
+    __slots__ = ("ids", "resolver", "_urls")
+
+    def __init__(self, ids: List[str], resolver: VideoResolver) -> None:
+        self.ids = ids
+        self.resolver = resolver
+        self._urls: Optional[List[str]] = None
+
+    @property
+    def resolved(self) -> bool:
+        return self._urls is not None
+
+    def urls(self) -> List[str]:
+        """The player urls, looked up if needed"""
+        if self._urls is None:
+            self._urls = players_for(self.ids, self.resolver.resolve())
+        return self._urls
+
+    def __getitem__(self, index: Any) -> Any:
+        return self.urls()[index]
+
+    def __len__(self) -> int:
+        return len(self.urls())
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.urls())
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, LazyVideos):
+            other = other.urls()
+        return self.urls() == other
+
+    def __repr__(self) -> str:
+        if self._urls is None:
+            return f"LazyVideos(ids={self.ids!r})"
+        return repr(self._urls)
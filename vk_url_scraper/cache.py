@@ -0,0 +1,145 @@
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Tuple
+
+from .utils import dumps, loads
+
+
+class ResponseCache(ABC):
+    """Interface of the API response caches a VkScraper can use, entries are raw API items keyed by
+    a string that identifies the object (eg: "wall.getById?copy_history_depth=2&extended=1|-1_2")"""
+
+    @abstractmethod
+    def get_many(self, keys: Iterable[str]) -> Dict[str, dict]:
+        """Returns the cached and not expired items among keys"""
+
+    @abstractmethod
+    def set_many(self, items: Dict[str, dict]) -> None:
+        """Stores items, evicting the least recently used ones beyond the cache size"""
+
+
+class MemoryCache(ResponseCache):
+    """In-memory LRU cache where entries expire after ttl seconds.
+
+    Cached items are shared with the results, which should not be modified in place.
+    """
+
+    def __init__(
+        self, maxsize: int = 10000, ttl: float = 3600, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        """
+        Parameters
+        ----------
+        maxsize : int
+            Max number of items kept
+        ttl : float
+            Seconds after which an item is considered stale and fetched again
+        clock : func
+            Clock in seconds, overridable for tests
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, dict]:
+        now = self.clock()
+        res = {}
+        with self.lock:
+            for key in keys:
+                entry = self.entries.get(key)
+                if entry is None:
+                    continue
+                if entry[0] <= now:
+                    del self.entries[key]
+                    continue
+                self.entries.move_to_end(key)
+                res[key] = entry[1]
+        return res
+
+    def set_many(self, items: Dict[str, dict]) -> None:
+        expires = self.clock() + self.ttl
+        with self.lock:
+            for key, item in items.items():
+                self.entries[key] = (expires, item)
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+
+class SQLiteCache(ResponseCache):
+    """On-disk cache in a SQLite database, shared between runs and processes, where entries expire after
+    ttl seconds and the least recently used ones are evicted beyond maxsize entries"""
+
+    def __init__(
+        self,
+        filename: str = "vk_cache.sqlite3",
+        maxsize: int = 1000000,
+        ttl: float = 24 * 3600,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        filename : str
+            SQLite database file, created if missing
+        maxsize : int
+            Max number of items kept
+        ttl : float
+            Seconds after which an item is considered stale and fetched again
+        clock : func
+            Wall clock in seconds (persisted across runs), overridable for tests
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(filename, check_same_thread=False)
+        with self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS items "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, used REAL NOT NULL)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS items_used ON items (used)")
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, dict]:
+        keys = list(keys)
+        now = self.clock()
+        res = {}
+        with self.lock, self.db:
+            # sqlite limits the number of variables of a statement
+            for i in range(0, len(keys), 500):
+                chunk = keys[i : i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.db.execute(
+                    f"SELECT key, value FROM items WHERE key IN ({placeholders}) AND expires > ?",
+                    [*chunk, now],
+                ).fetchall()
+                for key, value in rows:
+                    res[key] = loads(value)
+                self.db.executemany(
+                    "UPDATE items SET used = ? WHERE key = ?", [(now, key) for key, _ in rows]
+                )
+        return res
+
+    def set_many(self, items: Dict[str, dict]) -> None:
+        now = self.clock()
+        with self.lock, self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO items (key, value, expires, used) VALUES (?, ?, ?, ?)",
+                [(key, dumps(item), now + self.ttl, now) for key, item in items.items()],
+            )
+            self.db.execute("DELETE FROM items WHERE expires <= ?", (now,))
+            (size,) = self.db.execute("SELECT COUNT(*) FROM items").fetchone()
+            if size > self.maxsize:
+                self.db.execute(
+                    "DELETE FROM items WHERE key IN (SELECT key FROM items ORDER BY used LIMIT ?)",
+                    (size - self.maxsize,),
+                )
+
+    def close(self) -> None:
+        self.db.close()
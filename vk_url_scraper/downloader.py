@@ -0,0 +1,422 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+
+from .manifest import DownloadManifest, link_or_copy
+from .metrics import Metrics
+from .transport import HttpTransport
+
+if TYPE_CHECKING:
+    import yt_dlp
+
+logger = logging.getLogger(__name__)
+
+# (type, url, filename) of a photo or video to download
+DownloadTask = Tuple[str, str, str]
+
+CONTENT_RANGE_PATTERN = re.compile(r"bytes 0-\d+/(\d+)")
+
+
+@dataclass
+class SegmentedDownload:
+    """How files of a media type are split into concurrent byte-range requests, see MediaDownloader"""
+
+    # number of ranges (and connections) a file is split into
+    segments: int = 4
+    # smaller files are downloaded over a single connection
+    min_size: int = 4 * 1024 * 1024
+
+
+class DownloadError(Exception):
+    """Raised when a server answers a download with something that is not the expected media"""
+
+
+class YtDlpLogger:
+    """Sends the yt-dlp output to the module logger at debug level, failures are logged by MediaDownloader"""
+
+    def debug(self, msg: str) -> None:
+        logger.debug(msg)
+
+    info = warning = error = debug
+
+
+class MediaDownloader:
+    """Downloads photos and videos found in scrape results.
+
+    Photos (quick HTTP GETs) and videos (slow yt-dlp jobs) run in separate worker pools so that
+    videos never hold photos back, and every host gets at most max_per_host downloads at once.
+    """
+
+    HEADERS = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/81.0.4044.138 Safari/537.36"
+    }
+    # content types accepted for photos, anything else (eg: an html error page) is not saved
+    PHOTO_CONTENT_TYPES = ("image/", "application/octet-stream")
+
+    def __init__(
+        self,
+        transport: HttpTransport,
+        max_per_host: int = 4,
+        chunk_size: int = 1024 * 1024,
+        manifest: Optional[DownloadManifest] = None,
+        metrics: Optional[Metrics] = None,
+        segmented: Optional[Dict[str, SegmentedDownload]] = None,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        transport : HttpTransport
+            Transport used for photo downloads
+        max_per_host : int
+            Max number of concurrent downloads from the same host
+        chunk_size : int
+            Photos are streamed to disk in chunks of this many bytes instead of being held in memory
+        manifest : DownloadManifest
+            If given, media already downloaded is skipped (or linked when the same media is shared by
+            several results), interrupted photo downloads are resumed and completed downloads are recorded
+        metrics : Metrics
+            If given, download durations, counts, bytes and errors are recorded in it
+        segmented : Dict[str, SegmentedDownload]
+            Media types ("photo", "video") whose large files are split into concurrent byte-range requests
+            written in place into a preallocated file, eg: {"photo": SegmentedDownload(segments=4)}, files
+            from servers that do not support ranges are streamed over a single connection. Only videos
+            that yt-dlp resolves to a single direct file can be segmented, others are left to yt-dlp
+        """
+        self.transport = transport
+        self.max_per_host = max_per_host
+        self.chunk_size = chunk_size
+        self.manifest = manifest
+        self.metrics = metrics
+        self.segmented = segmented or {}
+        self.host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self.lock = threading.Lock()
+        # one long-lived yt-dlp instance per worker thread, instead of one per video
+        self.local = threading.local()
+        self.ydls: List["yt_dlp.YoutubeDL"] = []
+
+    def download_all(
+        self, tasks: List[DownloadTask], photo_workers: int = 8, video_workers: int = 2
+    ) -> List[str]:
+        """Downloads every task using photo_workers threads for photos and video_workers threads for videos
+
+        Returns
+        -------
+        the final filenames in the same order as the tasks, failed downloads are left out
+        """
+        with ThreadPoolExecutor(max_workers=photo_workers) as photos, ThreadPoolExecutor(
+            max_workers=video_workers
+        ) as videos:
+            futures = [
+                (photos if kind == "photo" else videos).submit(self.download, kind, url, filename)
+                for kind, url, filename in tasks
+            ]
+            return [f for f in (future.result() for future in futures) if f is not None]
+
+    def download(self, kind: str, url: str, filename: str) -> Optional[str]:
+        """Downloads a single photo or video, returns the final filename or None if the download failed"""
+        if self.metrics is None:
+            return self._download(kind, url, filename)
+        with self.metrics.stage("download", kind=kind):
+            res = self._download(kind, url, filename)
+        if res is None:
+            self.metrics.count("download_errors", kind=kind)
+        else:
+            self.metrics.count("downloads", kind=kind)
+            if os.path.isfile(res):
+                self.metrics.count("download_bytes", os.path.getsize(res), kind=kind)
+        return res
+
+    def _download(self, kind: str, url: str, filename: str) -> Optional[str]:
+        with self._host_slot(url):
+            try:
+                if self.manifest is not None:
+                    cached = self.manifest.find(url, filename)
+                    if cached is not None:
+                        if "%(ext)s" in filename:
+                            filename = filename.replace("%(ext)s", cached.rsplit(".", 1)[-1])
+                        return link_or_copy(cached, filename)
+                if kind == "photo":
+                    return self.download_photo(url, filename)
+                # already loaded by the first video, see _youtube_dl
+                import yt_dlp
+
+                try:
+                    return self.download_video(url, filename)
+                except yt_dlp.utils.YoutubeDLError as e:  # eg: a private or deleted video
+                    logger.warning(f"could not download {url}: {e}")
+                    return None
+            except (DownloadError, requests.RequestException, OSError) as e:
+                logger.warning(f"could not download {url}: {e}")
+                return None
+
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.host_slots:
+                self.host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self.host_slots[host]
+
+    def download_photo(self, url: str, filename: str) -> str:
+        """Streams a photo into a temporary file that is only renamed to filename once complete.
+
+        With a manifest, a .part file left by an interrupted download is resumed with a Range request.
+        """
+        part_filename = f"{filename}.part"
+        headers = dict(self.HEADERS)
+        offset = 0
+        if self.manifest is not None and os.path.isfile(part_filename):
+            partial = self.manifest.get_partial(part_filename) or {}
+            # only resume if the remote file is still the one the .part file started from, without
+            # validators (eg: the process was killed before the manifest was saved) it is started over
+            validator = partial.get("etag") or partial.get("last_modified")
+            if validator:
+                offset = os.path.getsize(part_filename)
+                headers["Range"] = f"bytes={offset}-"
+                headers["If-Range"] = validator
+            else:
+                os.remove(part_filename)
+        policy = self.segmented.get("photo")
+        if policy is not None and offset == 0:
+            # answered with a 206 and the file size by servers supporting ranges
+            headers["Range"] = "bytes=0-"
+        sha256 = hashlib.sha256()
+        with self.transport.get(url, headers=headers, stream=True) as d:
+            if d.status_code == 416:  # the .part file is not a prefix of the remote file
+                os.remove(part_filename)
+                return self.download_photo(url, filename)
+            d.raise_for_status()
+            content_type = d.headers.get("Content-Type", "")
+            if content_type and not content_type.startswith(self.PHOTO_CONTENT_TYPES):
+                raise DownloadError(f"unexpected content type {content_type}")
+            etag, last_modified = d.headers.get("ETag"), d.headers.get("Last-Modified")
+            if (
+                policy is not None
+                and offset == 0
+                and self._segment_download(d, url, headers, part_filename, policy)
+            ):
+                return self._complete_photo(
+                    url,
+                    part_filename,
+                    filename,
+                    self._file_sha256(part_filename),
+                    etag,
+                    last_modified,
+                )
+            resumed = (
+                offset > 0
+                and d.status_code == 206
+                and d.headers.get("Content-Range", "").startswith(f"bytes {offset}-")
+            )
+            if resumed:
+                with open(part_filename, "rb") as f:
+                    for chunk in iter(lambda: f.read(self.chunk_size), b""):
+                        sha256.update(chunk)
+            if self.manifest is not None:
+                self.manifest.record_partial(part_filename, url, etag, last_modified)
+            try:
+                with open(part_filename, "ab" if resumed else "wb") as f:
+                    for chunk in d.iter_content(chunk_size=self.chunk_size):
+                        f.write(chunk)
+                        sha256.update(chunk)
+            except BaseException:
+                if self.manifest is None:  # nothing to resume from later
+                    os.remove(part_filename)
+                raise
+        return self._complete_photo(url, part_filename, filename, sha256, etag, last_modified)
+
+    def _complete_photo(
+        self,
+        url: str,
+        part_filename: str,
+        filename: str,
+        sha256: "hashlib._Hash",
+        etag: Optional[str],
+        last_modified: Optional[str],
+    ) -> str:
+        os.replace(part_filename, filename)
+        if self.manifest is not None:
+            digest = sha256.hexdigest()
+            same_content = self.manifest.find_by_hash(digest)
+            if same_content is not None:
+                link_or_copy(same_content, filename)
+            self.manifest.record(url, filename, digest, etag, last_modified)
+        return filename
+
+    def _file_sha256(self, filename: str) -> "hashlib._Hash":
+        sha256 = hashlib.sha256()
+        if self.manifest is not None:  # only used to find duplicates in the manifest
+            with open(filename, "rb") as f:
+                for chunk in iter(lambda: f.read(self.chunk_size), b""):
+                    sha256.update(chunk)
+        return sha256
+
+    def _segment_download(
+        self,
+        response: requests.Response,
+        url: str,
+        headers: Dict[str, str],
+        filename: str,
+        policy: SegmentedDownload,
+    ) -> bool:
+        """Downloads a file in policy.segments concurrent byte ranges written in place into filename.
+
+        response is the answer to a "Range: bytes=0-" request, it is used for the first range. Nothing is
+        done (and False returned) if the server ignored the range or the file is smaller than policy.min_size.
+        """
+        match = CONTENT_RANGE_PATTERN.match(response.headers.get("Content-Range", ""))
+        if response.status_code != 206 or match is None or policy.segments < 2:
+            return False
+        total = int(match.group(1))
+        if total < policy.min_size:
+            return False
+        size = -(-total // policy.segments)
+        ranges = [(start, min(start + size, total) - 1) for start in range(0, total, size)]
+
+        def fetch(start: int, end: int) -> None:
+            if start == 0:
+                self._write_range(fd, response, start, end)
+                return
+            range_headers = {**headers, "Range": f"bytes={start}-{end}"}
+            with self.transport.get(url, headers=range_headers, stream=True) as r:
+                r.raise_for_status()
+                content_range = r.headers.get("Content-Range", "")
+                if r.status_code != 206 or not content_range.startswith(f"bytes {start}-{end}/"):
+                    raise DownloadError(f"unexpected answer to the range {start}-{end}")
+                self._write_range(fd, r, start, end)
+
+        fd = os.open(filename, os.O_RDWR | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0))
+        try:
+            try:
+                os.posix_fallocate(fd, 0, total)
+            except (AttributeError, OSError):  # not on this platform or file system
+                os.ftruncate(fd, total)
+            with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+                for future in [executor.submit(fetch, *r) for r in ranges]:
+                    future.result()
+        except BaseException:
+            os.close(fd)
+            # a file with holes cannot be resumed from its size
+            os.remove(filename)
+            raise
+        os.close(fd)
+        if self.metrics is not None:
+            self.metrics.count("download_segments", len(ranges))
+        return True
+
+    def _write_range(self, fd: int, response: requests.Response, start: int, end: int) -> None:
+        """Writes the body of a response at its offset in the file, stopping at end (included)"""
+        offset, remaining = start, end - start + 1
+        for chunk in response.iter_content(chunk_size=self.chunk_size):
+            view = memoryview(chunk)[:remaining]
+            remaining -= len(view)
+            while view:
+                written = _write_at(fd, view, offset)
+                view, offset = view[written:], offset + written
+            if not remaining:
+                return
+        raise DownloadError(f"the range {start}-{end} ended {remaining} bytes early")
+
+    def download_video(self, url: str, filename: str) -> str:
+        """Downloads a video with yt-dlp, filename is an output template like "name.%(ext)s" """
+        ydl = self._youtube_dl()
+        # the instance is reused across videos, only its output template changes
+        ydl.params["outtmpl"]["default"] = filename
+        policy = self.segmented.get("video")
+        if policy is None:
+            info = ydl.extract_info(url, download=True)
+        else:
+            info = ydl.extract_info(url, download=False)
+            if info.get("protocol") in ("http", "https") and "requested_formats" not in info:
+                # a single direct file, eg: an mp4 on the CDN
+                self.download_file(
+                    info["url"], ydl.prepare_filename(info), policy, info.get("http_headers")
+                )
+            else:  # HLS/DASH streams or formats to merge
+                info = ydl.process_ie_result(info, download=True)
+        filename = ydl.prepare_filename(info)
+        if "unknown_video" in filename:
+            old_filename = filename
+            filename = filename.replace("unknown_video", "mp4")
+            os.replace(old_filename, filename)
+        if self.manifest is not None:
+            self.manifest.record(url, filename)
+        return filename
+
+    def download_file(
+        self,
+        url: str,
+        filename: str,
+        policy: SegmentedDownload,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> str:
+        """Downloads a file in byte ranges, or over a single connection if the server does not support
+        them, into a temporary file that is only renamed to filename once complete"""
+        part_filename = f"{filename}.part"
+        headers = {**self.HEADERS, **(headers or {})}
+        with self.transport.get(url, headers={**headers, "Range": "bytes=0-"}, stream=True) as d:
+            d.raise_for_status()
+            if not self._segment_download(d, url, headers, part_filename, policy):
+                try:
+                    with open(part_filename, "wb") as f:
+                        for chunk in d.iter_content(chunk_size=self.chunk_size):
+                            f.write(chunk)
+                except BaseException:
+                    os.remove(part_filename)
+                    raise
+        os.replace(part_filename, filename)
+        return filename
+
+    def _youtube_dl(self) -> "yt_dlp.YoutubeDL":
+        """Returns the yt-dlp instance of the current worker thread, creating it on first use"""
+        ydl = getattr(self.local, "ydl", None)
+        if ydl is None:
+            # imported on first video only, yt-dlp loads hundreds of extractor modules
+            import yt_dlp  # to download videos from url
+
+            ydl = yt_dlp.YoutubeDL(
+                {
+                    "format": "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best",
+                    "merge_output_format": "mp4",
+                    "retries": 5,
+                    "noplaylist": True,
+                    "outtmpl": "%(id)s.%(ext)s",
+                    "quiet": True,
+                    "no_warnings": True,
+                    "noprogress": True,
+                    # instead of printing, which would need stdout swapped for every thread
+                    "logger": YtDlpLogger(),
+                    "restrictfilenames": True,
+                    "simulate": False,
+                }
+            )
+            self.local.ydl = ydl
+            with self.lock:
+                self.ydls.append(ydl)
+        return ydl
+
+    def close(self) -> None:
+        """Releases the yt-dlp instances created by the worker threads"""
+        with self.lock:
+            ydls, self.ydls = self.ydls, []
+        for ydl in ydls:
+            ydl.close()
+
+
+_seek_lock = threading.Lock()
+
+
+def _write_at(fd: int, data: memoryview, offset: int) -> int:
+    """Positional write, which lets several threads write to the same file descriptor"""
+    if hasattr(os, "pwrite"):
+        return os.pwrite(fd, data, offset)
+    with _seek_lock:  # no pwrite on windows
+        os.lseek(fd, offset, os.SEEK_SET)
+        return os.write(fd, data)
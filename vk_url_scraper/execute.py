@@ -0,0 +1,85 @@
+import json
+import threading
+from concurrent.futures import Future
+from typing import Callable, List, Tuple
+
+ApiCall = Tuple[str, dict]
+
+
+class ExecuteBatcher:
+    """Coalesces pending API calls into VK `execute <https://dev.vk.com/method/execute>`__ requests.
+
+    Calls are queued with `submit` and sent on `flush` as execute requests of up to MAX_CALLS
+    calls each, every sub-response is then delivered to the future returned by `submit` as a
+    regular API response: {"response": ...} or {"error": {...}}.
+    """
+
+    # execute runs at most 25 API calls per request
+    MAX_CALLS = 25
+
+    def __init__(self, run_calls: Callable[[List[ApiCall]], List[dict]]) -> None:
+        """
+        Parameters
+        ----------
+        run_calls : func
+            Function that receives a list of (method, params) calls and returns their responses in
+            the same order, used to send the execute requests
+        """
+        self.run_calls = run_calls
+        self.lock = threading.Lock()
+        self.pending: List[Tuple[ApiCall, Future]] = []
+
+    def submit(self, method: str, params: dict) -> Future:
+        """Queues an API call like ("wall.getById", {"posts": "-1_2"}) until the next flush"""
+        future: Future = Future()
+        with self.lock:
+            self.pending.append(((method, params), future))
+        return future
+
+    def flush(self) -> None:
+        """Sends every pending call and resolves their futures"""
+        with self.lock:
+            pending, self.pending = self.pending, []
+        if not pending:
+            return
+        groups = [pending[i : i + self.MAX_CALLS] for i in range(0, len(pending), self.MAX_CALLS)]
+        try:
+            responses = self.run_calls(
+                [("execute", {"code": self.build_code([c for c, _ in g])}) for g in groups]
+            )
+        except Exception as e:
+            for _, future in pending:
+                future.set_exception(e)
+            return
+        for group, api_res in zip(groups, responses):
+            for (_, future), sub_res in zip(group, self.split_response(api_res, len(group))):
+                future.set_result(sub_res)
+
+    def run(self, calls: List[ApiCall]) -> List[dict]:
+        """Submits calls, flushes and returns their responses in order"""
+        futures = [self.submit(method, params) for method, params in calls]
+        self.flush()
+        return [future.result() for future in futures]
+
+    @staticmethod
+    def build_code(calls: List[ApiCall]) -> str:
+        """Builds the VKScript code that runs every call and returns their responses as an array"""
+        api_calls = ",".join(f"API.{method}({json.dumps(params)})" for method, params in calls)
+        return f"return [{api_calls}];"
+
+    @staticmethod
+    def split_response(api_res: dict, size: int) -> List[dict]:
+        """Splits an execute response into one API response per sub-call"""
+        if "error" in api_res:
+            return [{"error": api_res["error"]}] * size
+        # failed sub-calls return false and have their error in execute_errors, in call order
+        errors = iter(api_res.get("execute_errors", []))
+        res = []
+        sub_responses = list(api_res.get("response") or [])
+        sub_responses += [False] * (size - len(sub_responses))
+        for sub_res in sub_responses:
+            if sub_res is False:
+                res.append({"error": next(errors, {"error_code": 0, "error_msg": "unknown error"})})
+            else:
+                res.append({"response": sub_res})
+        return res
@@ -0,0 +1,143 @@
+import re
+from typing import Container, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# one pass over the text for every supported type, the optional separator before the owner id is usually
+# "-" (community ids are negative) but urls also show up as eg: "?w=wall-1_2" or "z=video1_2%2F..."
+ID_PATTERN = re.compile(
+    r"(?P<type>wall|photo|video)(?P<sep>\D?)(?P<owner>\d+)_(?P<item>\d+)(?:_(?P<key>\w+))?"
+)
+# only video ids carry an access key
+ACCESS_KEY_TYPES = {"video"}
+# the end of a chunk that may be the start of an id: a run of word characters and dashes, with the
+# type and separator before it when that character is the separator of an id like "photo=1_2"
+TAIL_PATTERN = re.compile(r"(?:(?:wall|photo|video).)?[\w-]*\Z", re.DOTALL)
+# longest tail carried over to the next chunk, so text without separators (eg: base64) is not kept whole
+MAX_TAIL = 256
+
+
+class VkId(NamedTuple):
+    """A vk.com object id found in a text"""
+
+    type: str
+    owner_id: int
+    item_id: int
+    access_key: Optional[str]
+    # offsets of the match in the source text
+    start: int
+    end: int
+
+    @property
+    def id(self) -> str:
+        """Canonical id like "wall-1_2", as used in results"""
+        return f"{self.type}{self.owner_id}_{self.item_id}"
+
+    @property
+    def full_id(self) -> str:
+        """Id including the access key when there is one, like "video-1_2_abcdef", as sent to the API"""
+        if self.access_key:
+            return f"{self.id}_{self.access_key}"
+        return self.id
+
+
+def iter_ids(text: str, offset: int = 0) -> Iterator[VkId]:
+    """Yields every wall, photo and video id in text, in order of appearance and without deduplication
+
+    Parameters
+    ----------
+    text : str
+        any text with vk.com URLs or ids
+    offset : int
+        added to the start/end offsets, for texts that are part of a larger document
+    """
+    for m in ID_PATTERN.finditer(text):
+        type_ = m.group("type")
+        owner_id = int(m.group("owner"))
+        if m.group("sep") == "-":
+            owner_id = -owner_id
+        yield VkId(
+            type_,
+            owner_id,
+            int(m.group("item")),
+            m.group("key") if type_ in ACCESS_KEY_TYPES else None,
+            m.start() + offset,
+            m.end() + offset,
+        )
+
+
+def extract_ids(text: str, types: Optional[Container[str]] = None) -> List[VkId]:
+    """Extracts the wall, photo and video ids of a text in a single pass, deduplicated.
+
+    Parameters
+    ----------
+    text : str
+        any text with vk.com URLs or ids
+    types : Container[str]
+        only keep these types, eg: {"wall"}, defaults to all of them
+
+    Returns
+    -------
+    a list of VkId in order of first appearance, repeated ids only keep their first occurrence
+    (with the access key of a later one if the first had none).
+    """
+    return list(_dedupe(iter_ids(text), types).values())
+
+
+def extract_ids_from_file(
+    filename: str, types: Optional[Container[str]] = None, chunk_size: int = 1024 * 1024
+) -> Iterator[VkId]:
+    """Scans a large text file in chunks and yields its deduplicated ids as they are found.
+
+    Parameters
+    ----------
+    filename : str
+        path of a utf-8 text file, like a chat export
+    types : Container[str]
+        only keep these types, eg: {"wall"}, defaults to all of them
+    chunk_size : int
+        number of characters read at a time
+
+    Returns
+    -------
+    an iterator of VkId in order of first appearance, offsets are character offsets in the file.
+    """
+    seen = set()
+    offset = 0
+    tail = ""
+    with open(filename, encoding="utf-8", errors="replace") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            text = tail + chunk
+            if chunk:
+                text, tail = _split_tail(text)
+            else:
+                tail = ""
+            for vk_id in iter_ids(text, offset):
+                key = (vk_id.type, vk_id.owner_id, vk_id.item_id)
+                if (types is None or vk_id.type in types) and key not in seen:
+                    seen.add(key)
+                    yield vk_id
+            offset += len(text)
+            if not chunk:
+                break
+
+
+def _dedupe(
+    ids: Iterator[VkId], types: Optional[Container[str]]
+) -> Dict[Tuple[str, int, int], VkId]:
+    res: Dict[Tuple[str, int, int], VkId] = {}
+    for vk_id in ids:
+        if types is not None and vk_id.type not in types:
+            continue
+        key = (vk_id.type, vk_id.owner_id, vk_id.item_id)
+        if key not in res:
+            res[key] = vk_id
+        elif vk_id.access_key and not res[key].access_key:
+            res[key] = res[key]._replace(access_key=vk_id.access_key)
+    return res
+
+
+def _split_tail(text: str) -> Tuple[str, str]:
+    """Splits text before a trailing partial id that may continue in the next chunk"""
+    m = TAIL_PATTERN.search(text, max(len(text) - MAX_TAIL, 0))
+    cut = m.start() if m else len(text)
+    return text[:cut], text[cut:]
@@ -0,0 +1,150 @@
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+class DownloadManifest:
+    """Records what download_media already saved in a destination folder so that re-runs can skip it.
+
+    Entries are keyed by attachment URL and hold the file path (relative to the manifest), its size,
+    sha256 (photos only, videos can be several GB) and the ETag/Last-Modified headers it was served with.
+    Files with identical content, like a photo shared by several reposts, are stored once and hard linked.
+    """
+
+    def __init__(self, filename: str, save_interval: float = 5.0) -> None:
+        """
+        Parameters
+        ----------
+        filename : str
+            JSON file where the manifest is kept, it is loaded if it exists
+        save_interval : float
+            The manifest is also saved when something is recorded at least this many seconds after the
+            previous save, so that a killed process loses at most that much of it
+        """
+        self.filename = filename
+        self.save_interval = save_interval
+        self.root = os.path.dirname(os.path.abspath(filename))
+        self.lock = threading.Lock()
+        self.files: Dict[str, dict] = {}
+        # ETag/Last-Modified of .part files, to only resume them if the remote file did not change
+        self.partials: Dict[str, dict] = {}
+        if os.path.isfile(filename):
+            with open(filename) as f:
+                data = json.load(f)
+            self.files = data.get("files", {})
+            self.partials = data.get("partials", {})
+        # urls of the entries by relative path and by sha256, so that lookups do not scan every entry
+        self.urls_by_path: Dict[str, str] = {}
+        self.urls_by_hash: Dict[str, str] = {}
+        for url, entry in self.files.items():
+            self._index(url, entry)
+        self.saved_at = time.monotonic()
+
+    def find(self, url: str, filename: str) -> Optional[str]:
+        """Returns the path of a complete previous download of url, or of the same target filename
+        (VK signs its CDN urls so the url of a photo can change between scrapes)"""
+        with self.lock:
+            entries = [self.files.get(url)]
+            if "%(" not in filename:
+                same_path = self.urls_by_path.get(self._relpath(filename))
+                entries.append(self.files.get(same_path) if same_path else None)
+        return self._first_complete(entries)
+
+    def find_by_hash(self, sha256: str) -> Optional[str]:
+        """Returns the path of a complete download with the given content hash"""
+        with self.lock:
+            url = self.urls_by_hash.get(sha256)
+            entries = [self.files.get(url) if url else None]
+        return self._first_complete(entries)
+
+    def _first_complete(self, entries: List[Optional[dict]]) -> Optional[str]:
+        # checked outside of the lock, stat calls should not hold back the other download workers
+        for entry in entries:
+            if entry is not None and self._is_complete(entry):
+                return self._path(entry)
+        return None
+
+    def record(
+        self,
+        url: str,
+        path: str,
+        sha256: Optional[str] = None,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> None:
+        """Records a complete download of url saved at path"""
+        entry: dict = {
+            "id": os.path.splitext(os.path.basename(path))[0],
+            "path": self._relpath(path),
+            "size": os.path.getsize(path),
+            "sha256": sha256,
+            "etag": etag,
+            "last_modified": last_modified,
+        }
+        with self.lock:
+            self.files[url] = entry
+            self._index(url, entry)
+            self.partials.pop(entry["path"], None)
+        self._save_if_due()
+
+    def get_partial(self, path: str) -> Optional[dict]:
+        """Returns the validators recorded when the download to path started, if any"""
+        with self.lock:
+            return self.partials.get(self._relpath(path))
+
+    def record_partial(
+        self, path: str, url: str, etag: Optional[str], last_modified: Optional[str]
+    ) -> None:
+        """Records the validators of a download to path that may be resumed later"""
+        with self.lock:
+            self.partials[self._relpath(path)] = {
+                "url": url,
+                "etag": etag,
+                "last_modified": last_modified,
+            }
+        self._save_if_due()
+
+    def save(self) -> None:
+        """Writes the manifest atomically"""
+        with self.lock:
+            data = {"files": self.files, "partials": self.partials}
+            tmp_filename = f"{self.filename}.tmp"
+            with open(tmp_filename, "w") as f:
+                json.dump(data, f, indent=1)
+            os.replace(tmp_filename, self.filename)
+            self.saved_at = time.monotonic()
+
+    def _save_if_due(self) -> None:
+        if time.monotonic() - self.saved_at >= self.save_interval:
+            self.save()
+
+    def _index(self, url: str, entry: dict) -> None:
+        self.urls_by_path[entry["path"]] = url
+        if entry.get("sha256"):
+            self.urls_by_hash[entry["sha256"]] = url
+
+    def _relpath(self, path: str) -> str:
+        return os.path.relpath(os.path.abspath(path), self.root)
+
+    def _path(self, entry: dict) -> str:
+        return os.path.join(self.root, entry["path"])
+
+    def _is_complete(self, entry: dict) -> bool:
+        path = self._path(entry)
+        return os.path.isfile(path) and os.path.getsize(path) == entry["size"]
+
+
+def link_or_copy(source: str, target: str) -> str:
+    """Makes target point to the same content as source, with a hard link when the filesystem allows it"""
+    if os.path.abspath(source) == os.path.abspath(target):
+        return target
+    tmp_target = f"{target}.link"
+    try:
+        os.link(source, tmp_target)
+    except OSError:
+        shutil.copyfile(source, tmp_target)
+    os.replace(tmp_target, target)
+    return target
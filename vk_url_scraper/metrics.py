@@ -0,0 +1,156 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# sorted (name, value) pairs identifying a time series, eg: (("method", "wall.getById"),)
+Labels = Tuple[Tuple[str, str], ...]
+# called after every stage with its name, duration in seconds and labels
+StageListener = Callable[[str, float, Dict[str, str]], None]
+
+COUNTER_HELP = {
+    "api_requests": "API requests sent, by method",
+    "api_bytes": "Bytes of API responses",
+    "api_errors": "API responses with an error, by error code",
+    "retries": "API calls retried after a transient error",
+    "throttled": "API responses with a rate limit error",
+    "cache_hits": "API items served by the response cache",
+    "cache_misses": "API items requested because they were not cached",
+    "downloads": "Media downloaded, by type",
+    "download_bytes": "Bytes of media downloaded",
+    "download_errors": "Media downloads that failed",
+    "download_segments": "Byte ranges fetched by segmented downloads",
+}
+STAGE_HELP = {
+    "api_request": "HTTP round trip of an API request",
+    "json_decode": "Decoding of an API response",
+    "parse_walls": "Walking the attachments of wall posts",
+    "download": "Download of a photo or video",
+}
+
+
+class Metrics:
+    """Counters and stage timings of a VkScraper, with optional spans and a Prometheus text export.
+
+    A scraper records what it does (requests, bytes, cache hits, retries, throttling...) and how long
+    each stage of its hot path takes (API round trips, JSON decoding, attachment walking, downloads).
+    The same instance can be shared by several scrapers to aggregate them.
+    """
+
+    def __init__(self, tracer: Any = None, listeners: Optional[List[StageListener]] = None) -> None:
+        """
+        Parameters
+        ----------
+        tracer : opentelemetry.trace.Tracer
+            If given, every stage is also recorded as a span with `tracer.start_as_current_span`,
+            eg: opentelemetry.trace.get_tracer("vk_url_scraper")
+        listeners : List[func]
+            Functions called after every stage with (stage name, seconds, labels), eg: to feed a
+            histogram of another metrics library
+        """
+        self.tracer = tracer
+        self.listeners = list(listeners or [])
+        self.lock = threading.Lock()
+        self.counters: Dict[Tuple[str, Labels], float] = defaultdict(float)
+        # [count, total seconds, max seconds] of each stage
+        self.stages: Dict[Tuple[str, Labels], List[float]] = {}
+
+    def count(self, name: str, value: float = 1, **labels: Any) -> None:
+        """Adds value to a counter"""
+        key = (name, self._labels(labels))
+        with self.lock:
+            self.counters[key] += value
+
+    @contextmanager
+    def stage(self, name: str, **labels: Any) -> Iterator[None]:
+        """Times the block it wraps as the given stage"""
+        if self.tracer is not None:
+            with self.tracer.start_as_current_span(f"vk_url_scraper.{name}", attributes=labels):
+                with self._timed(name, labels):
+                    yield
+        else:
+            with self._timed(name, labels):
+                yield
+
+    @contextmanager
+    def _timed(self, name: str, labels: Dict[str, Any]) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def observe(self, name: str, seconds: float, **labels: Any) -> None:
+        """Records a stage duration measured by the caller"""
+        key = (name, self._labels(labels))
+        with self.lock:
+            stats = self.stages.setdefault(key, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+        for listener in self.listeners:
+            listener(name, seconds, dict(key[1]))
+
+    def snapshot(self) -> dict:
+        """Current values like {"counters": {"api_requests{method=wall.getById}": 3}, "stages": {...}}"""
+        with self.lock:
+            return {
+                "counters": {self._name(*key): value for key, value in self.counters.items()},
+                "stages": {
+                    self._name(*key): {"count": count, "seconds": total, "max_seconds": max_}
+                    for key, (count, total, max_) in self.stages.items()
+                },
+            }
+
+    def to_prometheus(self, namespace: str = "vk_url_scraper") -> str:
+        """Exports the metrics in the Prometheus text format, eg: to serve them on a /metrics endpoint"""
+        with self.lock:
+            counters = sorted(self.counters.items())
+            stages = sorted(self.stages.items())
+        lines = []
+        for name in sorted({name for (name, _), _ in counters}):
+            metric = f"{namespace}_{name}_total"
+            lines.append(f"# HELP {metric} {COUNTER_HELP.get(name, name)}")
+            lines.append(f"# TYPE {metric} counter")
+            for (other, labels), value in counters:
+                if other == name:
+                    lines.append(f"{metric}{self._prometheus_labels(labels)} {self._number(value)}")
+        if stages:
+            metric = f"{namespace}_stage_seconds"
+            lines.append(f"# HELP {metric} Duration of the stages of the scraper")
+            lines.append(f"# TYPE {metric} summary")
+            for (name, labels), (count, total, _) in stages:
+                stage_labels = self._prometheus_labels((("stage", name),) + labels)
+                lines.append(f"{metric}_sum{stage_labels} {self._number(total)}")
+                lines.append(f"{metric}_count{stage_labels} {self._number(count)}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self.lock:
+            self.counters.clear()
+            self.stages.clear()
+
+    @staticmethod
+    def _labels(labels: Dict[str, Any]) -> Labels:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    @staticmethod
+    def _name(name: str, labels: Labels) -> str:
+        if not labels:
+            return name
+        return f"{name}{{{','.join(f'{k}={v}' for k, v in labels)}}}"
+
+    @staticmethod
+    def _number(value: float) -> str:
+        # exact, unlike {:g} which turns 1234567 bytes into 1.23457e+06
+        return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+    @staticmethod
+    def _prometheus_labels(labels: Labels) -> str:
+        if not labels:
+            return ""
+        escaped = (
+            (k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in labels
+        )
+        return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
@@ -0,0 +1,145 @@
+import json
+import logging
+import os
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .execute import ApiCall, ExecuteBatcher
+from .records import Result
+from .scraper import VkScraper
+
+logger = logging.getLogger(__name__)
+
+
+class WallMonitor:
+    """Polls the walls of users and communities for posts published since the previous poll.
+
+    For each owner the id and date of the newest post seen (its high-water mark) are kept, optionally
+    in a state file shared between runs. A poll reads the first page of every wall with
+    `wall.get <https://dev.vk.com/method/wall.get>`__, sent as execute requests of up to 25 owners,
+    and only reads further pages of walls whose whole page was new. So a poll costs about one request per
+    25 owners plus the new content, however long the walls are.
+    """
+
+    def __init__(
+        self,
+        scraper: VkScraper,
+        owner_ids: Iterable[int],
+        state_file: Optional[str] = None,
+        page_size: int = 10,
+        max_pages: int = 10,
+        backfill: int = 0,
+        use_execute: bool = True,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        scraper : VkScraper
+            The scraper making the API calls and building the results
+        owner_ids : List[int]
+            Ids of the users and communities (negative ids) to watch, eg: [-1, 12345]
+        state_file : str
+            JSON file where the high-water marks are loaded from and saved after every poll
+        page_size : int
+            Posts read per wall.get call (at most 100)
+        max_pages : int
+            Max pages read from a wall in one poll, older new posts are skipped beyond that
+        backfill : int
+            Number of latest posts returned for owners seen for the first time (up to page_size), by
+            default only posts published after the first poll are returned
+        use_execute : bool
+            Coalesce the wall.get calls of several owners into execute requests
+        """
+        self.scraper = scraper
+        self.owner_ids = list(dict.fromkeys(owner_ids))
+        self.state_file = state_file
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.backfill = backfill
+        self.batcher = ExecuteBatcher(scraper._run_concurrently) if use_execute else None
+        # owner id (as a string, like in the state file) -> {"last_id": ..., "last_date": ...}
+        self.state: Dict[str, dict] = {}
+        if state_file is not None and os.path.isfile(state_file):
+            with open(state_file) as f:
+                self.state = json.load(f)
+
+    def poll(self) -> List[Result]:
+        """Fetches the posts published since the previous poll and moves the high-water marks forward
+
+        Returns
+        -------
+        the new posts as in VkScraper.scrape_wall_ids, owner by owner and oldest first.
+        """
+        new_posts: Dict[int, Dict[int, dict]] = {owner_id: {} for owner_id in self.owner_ids}
+        newest: Dict[int, dict] = {}
+        offsets = {owner_id: 0 for owner_id in self.owner_ids}
+        while offsets:
+            owners = list(offsets)
+            calls: List[ApiCall] = [
+                (
+                    "wall.get",
+                    {
+                        "owner_id": str(owner_id),
+                        "offset": str(offsets[owner_id]),
+                        "count": str(self.page_size),
+                    },
+                )
+                for owner_id in owners
+            ]
+            responses = self.scraper._call_many(calls, self.batcher)
+            for owner_id, api_res in zip(owners, responses):
+                offset = offsets.pop(owner_id)
+                if "error" in api_res:
+                    logger.warning(f"could not read the wall of {owner_id}: {api_res['error']}")
+                    continue
+                items = api_res.get("response", {}).get("items", [])
+                for item in items:
+                    if item["id"] > newest.get(owner_id, {"id": 0})["id"]:
+                        newest[owner_id] = item
+                mark = self.state.get(str(owner_id))
+                if mark is None:
+                    # an empty wall gets a mark too, so that its first post is reported as new
+                    self.state[str(owner_id)] = {"last_id": 0, "last_date": None}
+                    # first time this owner is seen: only the latest posts of the first page are returned
+                    latest = sorted(items, key=lambda i: i["id"], reverse=True)[: self.backfill]
+                    new_posts[owner_id].update((i["id"], i) for i in latest)
+                    continue
+                fresh = [i for i in items if i["id"] > mark["last_id"]]
+                new_posts[owner_id].update((i["id"], i) for i in fresh)
+                # a pinned post stays on top of the wall whatever its age
+                regular = [i for i in items if not i.get("is_pinned")]
+                whole_page_new = len(items) == self.page_size and all(
+                    i["id"] > mark["last_id"] for i in regular
+                )
+                if whole_page_new and offset // self.page_size + 1 < self.max_pages:
+                    offsets[owner_id] = offset + self.page_size
+                elif whole_page_new:
+                    logger.warning(f"more than {self.max_pages} pages of new posts for {owner_id}")
+
+        for owner_id, item in newest.items():
+            if item["id"] > self.state[str(owner_id)]["last_id"]:
+                self.state[str(owner_id)] = {"last_id": item["id"], "last_date": item.get("date")}
+        self.save()
+        items = [
+            item for owner_id in self.owner_ids for _, item in sorted(new_posts[owner_id].items())
+        ]
+        return self.scraper._finalize(self.scraper._build_wall_results(items))
+
+    def watch(self, interval: float = 60, cycles: Optional[int] = None) -> Iterator[Result]:
+        """Polls every interval seconds (or cycles times), yielding new posts as they are found"""
+        cycle = 0
+        while cycles is None or cycle < cycles:
+            started = time.monotonic()
+            yield from self.poll()
+            cycle += 1
+            if cycles is None or cycle < cycles:
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    def save(self) -> None:
+        """Writes the high-water marks to the state file atomically, if there is one"""
+        if self.state_file is None:
+            return
+        tmp_filename = f"{self.state_file}.tmp"
+        with open(tmp_filename, "w") as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(tmp_filename, self.state_file)
@@ -0,0 +1,72 @@
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+# VK API error codes, see https://dev.vk.com/reference/errors
+USER_AUTHORIZATION_FAILED = 5
+INTERNAL_SERVER_ERROR = 10
+TOO_MANY_REQUESTS_PER_SECOND = 6
+FLOOD_CONTROL = 9
+CAPTCHA_NEEDED = 14
+RATE_LIMIT_REACHED = 29
+# errors that go away by themselves when the same call is retried a little later
+RETRYABLE_ERRORS = {TOO_MANY_REQUESTS_PER_SECOND, INTERNAL_SERVER_ERROR}
+# errors meaning that the token is sending too many requests
+THROTTLING_ERRORS = {TOO_MANY_REQUESTS_PER_SECOND, FLOOD_CONTROL, RATE_LIMIT_REACHED}
+
+
+class TokenBucket:
+    """Thread-safe token bucket that paces calls to at most `rate` per second with bursts of `capacity`"""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        rate : float
+            Tokens added per second, ie: the sustained number of calls per second
+        capacity : float
+            Max tokens the bucket holds, ie: how many calls can burst at once, defaults to rate
+        clock : func
+            Monotonic clock in seconds, overridable for tests
+        sleep : func
+            Function used to wait, overridable for tests
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = self.capacity
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1) -> float:
+        """Takes tokens from the bucket, waiting until they are available
+
+        Returns
+        -------
+        the number of seconds waited
+        """
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # tokens are reserved right away (possibly going negative) so that concurrent
+            # callers queue up behind each other instead of all waking up at the same time
+            self.tokens -= tokens
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with jitter: a random delay in [half, full] of min(cap, base * 2**attempt)"""
+    delay = min(cap, base * 2**attempt)
+    return random.uniform(delay / 2, delay)
@@ -0,0 +1,88 @@
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+# what is kept of the raw API item of each result: "full", "none", "raw" (compact JSON bytes, decoded on
+# access, ScrapeResult only) or a sequence of field names to keep, eg: ["likes", "views"]
+PayloadPolicy = Union[str, Sequence[str]]
+
+
+@dataclass(slots=True)
+class ScrapeResult:
+    """Compact alternative to the result dicts described in VkScraper, with the same fields.
+
+    It also supports `result["id"]`-style access so it can be passed to download_media or any code
+    written for the dicts, and `to_dict()` converts it back.
+    """
+
+    id: str
+    text: str
+    datetime: Optional[datetime]
+    attachments: Dict[str, List[str]]
+    # the API item, the projected part of it or None, see PayloadPolicy
+    projected_payload: Optional[dict] = None
+    # the API item as compact JSON bytes when the "raw" payload policy is used
+    raw_payload: Optional[bytes] = field(default=None, repr=False)
+    error: Optional[dict] = None
+
+    @property
+    def payload(self) -> dict:
+        """The raw API item (or the kept part of it), decoded on each access for the "raw" policy"""
+        if self.raw_payload is not None:
+            return json.loads(self.raw_payload)
+        return self.projected_payload or {}
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.keys():
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.keys()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self[key] if key in self else default
+
+    def keys(self) -> List[str]:
+        keys = ["id", "text", "datetime", "attachments", "payload"]
+        if self.error is not None:
+            keys.append("error")
+        return keys
+
+    def to_dict(self) -> dict:
+        """Converts this record to the result dict described in VkScraper"""
+        return {key: self[key] for key in self.keys()}
+
+
+# what the scrape* functions return depending on the VkScraper result_type
+Result = Union[dict, ScrapeResult]
+
+
+def apply_payload_policy(result: dict, policy: PayloadPolicy) -> dict:
+    """Returns the payload of a result dict trimmed according to policy ("raw" is not supported for dicts)"""
+    if policy == "full":
+        return result["payload"]
+    if policy == "none":
+        return {}
+    if isinstance(policy, str):
+        raise ValueError(f"unsupported payload policy for dict results: {policy}")
+    return {k: result["payload"][k] for k in policy if k in result["payload"]}
+
+
+def to_record(result: dict, policy: PayloadPolicy) -> ScrapeResult:
+    """Converts a result dict into a ScrapeResult keeping the payload according to policy"""
+    record = ScrapeResult(
+        result["id"],
+        result["text"],
+        result["datetime"],
+        result["attachments"],
+        error=result.get("error"),
+    )
+    if policy == "raw":
+        record.raw_payload = json.dumps(
+            result["payload"], ensure_ascii=False, separators=(",", ":")
+        ).encode()
+    elif policy != "none":
+        record.projected_payload = apply_payload_policy(result, policy)
+    return record
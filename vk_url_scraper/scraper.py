@@ -1,16 +1,37 @@
+import logging
 import os
 import re
-import shutil
+import time
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Optional
-from urllib.parse import urlparse
-
-import requests
-import vk_api  # used to get api_token after authentication
-import yt_dlp  # to download videos from url
-
-from .utils import captcha_handler, suppress_stdout
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlencode, urlparse
+
+from .attachments import (
+    VIDEO_RESOLUTIONS,
+    LazyVideos,
+    VideoResolver,
+    players_for,
+    video_page_url,
+)
+from .cache import ResponseCache
+from .downloader import DownloadTask, MediaDownloader, SegmentedDownload
+from .execute import ApiCall, ExecuteBatcher
+from .extractor import VkId, extract_ids, iter_ids
+from .manifest import DownloadManifest
+from .metrics import Metrics
+from .ratelimit import RETRYABLE_ERRORS, THROTTLING_ERRORS, TokenBucket, backoff_delay
+from .records import PayloadPolicy, Result, apply_payload_policy, to_record
+from .tokens import TokenPool, TokenSession
+from .transport import HttpTransport
+from .utils import captcha_handler
+
+logger = logging.getLogger(__name__)
+
+# (method, ids parameter name, ids, extra params) describing a lookup of API items by id
+ItemsQuery = Tuple[str, str, List[str], dict]
 
 
 class VkScraper:
@@ -31,13 +52,24 @@ class VkScraper:
                 "video": [list of urls with max quality],
                 "link": [list of urls with max quality],
             },
-            "payload": {"more": "original JSON response as dict which you can parse for more data"}
+            "payload": {"more": "original JSON response as dict which you can parse for more data"},
+            # only present for ids that could not be fetched because of an API error, eg: after
+            # retrying a throttled call too many times, in which case text/attachments are empty
+            "error": {"code": 6, "message": "Too many requests per second"},
         }
     """
 
+    # kept for backwards compatibility, ids are extracted in a single pass by extractor.extract_ids
     WALL_PATTERN = re.compile(r"(wall.{0,1}\d+_\d+)")
     PHOTO_PATTERN = re.compile(r"(photo.{0,1}\d+_\d+)")
     VIDEO_PATTERN = re.compile(r"(video.{0,1}\d+_\d+(?:_\w+)?)")
+    # max number of ids each method accepts in a single call, longer lists are chunked
+    ID_LIMITS = {"wall.getById": 100, "photos.getById": 100, "video.get": 200}
+    # kept in the download_media destination folder when cache is set
+    MANIFEST_FILENAME = ".vk_url_scraper_manifest.json"
+    # base and max delay in seconds between retries of calls that failed with a transient error
+    RETRY_BACKOFF = 0.5
+    MAX_RETRY_BACKOFF = 10.0
 
     def __init__(
         self,
@@ -46,6 +78,17 @@ class VkScraper:
         token: Optional[str] = None,
         session_file="vk_config.v2.json",
         captcha_handler=captcha_handler,
+        transport: Optional[HttpTransport] = None,
+        max_workers: int = 4,
+        use_execute: bool = False,
+        requests_per_second: Optional[float] = 3,
+        max_retries: int = 5,
+        cache: Optional[ResponseCache] = None,
+        result_type: str = "dict",
+        payload: PayloadPolicy = "full",
+        token_pool: Optional[TokenPool] = None,
+        metrics: Optional[Metrics] = None,
+        video_resolution: str = "eager",
     ) -> None:
         """Initializes the scraper.
 
@@ -64,7 +107,57 @@ class VkScraper:
             File name where the VK session is saved so future logins are easier, this will not be created if token is passed
         captcha_handler : func
             Function that can receive a vk_api captcha instance and help the user solve it, default is a complete CLI handler
+        transport : HttpTransport
+            HTTP transport used for all API and media calls, pass one to configure connection pooling,
+            timeouts or to inject your own requests.Session, eg: HttpTransport(session=my_session)
+        max_workers : int
+            Max number of API calls running concurrently when a list of ids is split into several chunks
+        use_execute : bool
+            If set, API calls that are sent together are coalesced into `execute <https://dev.vk.com/method/execute>`__
+            requests of up to 25 calls each, which greatly reduces the number of requests and the rate-limit usage
+        requests_per_second : float
+            Max API requests per second shared by all API methods (VK allows 3 for user tokens), None to disable
+        max_retries : int
+            How many times a call is retried, with jittered exponential backoff, when VK answers with a
+            transient error like "too many requests per second"
+        cache : ResponseCache
+            Cache of API items by object id, eg: MemoryCache() or SQLiteCache("vk_cache.sqlite3"), ids found in
+            it are served without any API call and only the missing ones are requested
+        result_type : str
+            "dict" to return the dicts described in the class documentation or "compact" to return ScrapeResult
+            records (slotted objects with the same fields, which also support result["id"] access)
+        payload : str or List[str]
+            What to keep of the raw API item in "payload": "full" (default), "none", "raw" (compact results only:
+            kept as JSON bytes and decoded on access) or a list of fields to keep, eg: ["likes", "views"]
+        token_pool : TokenPool
+            If given, API calls are spread over its tokens (each with its own rate limit, requests_per_second
+            is then ignored) instead of using the session token, see also `VkScraper.from_tokens`
+        metrics : Metrics
+            Where counters and stage timings are recorded (eg: one shared by several scrapers, with a
+            tracer or listeners), a new Metrics is created by default, see `scraper.metrics`
+        video_resolution : str
+            How video attachments of wall posts are returned: "eager" (player urls, looked up with extra
+            video.get calls), "lazy" (LazyVideos that look up the player urls of the whole batch the first time
+            one of them is read) or "none" (vk.com/video urls built from the ids without their access key and
+            without any extra call, enough for text-only pipelines, use "lazy" or "eager" if private videos
+            must stay playable), can be overridden by the wall scraping methods
         """
+        self._configure(
+            transport,
+            max_workers,
+            use_execute,
+            requests_per_second,
+            max_retries,
+            cache,
+            result_type,
+            payload,
+            token_pool,
+            metrics,
+            video_resolution,
+        )
+        # imported here so that importing the package stays cheap, vk_api pulls in its own HTTP stack
+        import vk_api  # used to get api_token after authentication
+
         self.session = vk_api.VkApi(
             username,
             password,
@@ -75,39 +168,387 @@ class VkScraper:
         if token is None or len(token) == 0:
             self.session.auth(token_only=True)
 
-    def scrape(self, url: str) -> List:
+    @classmethod
+    def from_token(
+        cls, token: str, api_version: str = TokenSession.API_VERSION, **kwargs
+    ) -> "VkScraper":
+        """Creates a scraper from an access token without vk_api: no session file, no authentication
+        and no network call, which makes it cheap to create one per request or per account.
+
+        Parameters
+        ----------
+        token : str
+            Access token of a vk.com account, eg: the "access_token" of a vk_config.v2.json file
+        api_version : str
+            Version of the vk.com API to use
+        kwargs :
+            Any other option of VkScraper, eg: transport (share one between scrapers to share its
+            connection pool), cache, use_execute, result_type...
+        """
+        scraper = cls.__new__(cls)
+        scraper._configure(**kwargs)
+        scraper.session = TokenSession(token, api_version)
+        return scraper
+
+    @classmethod
+    def from_tokens(
+        cls,
+        tokens: Sequence[str],
+        api_version: str = TokenSession.API_VERSION,
+        strategy: str = "round_robin",
+        requests_per_second: Optional[float] = 3,
+        **kwargs,
+    ) -> "VkScraper":
+        """Creates a scraper that spreads its API calls over the access tokens of several accounts,
+        without vk_api (see `from_token`), usage counters are available with `scraper.token_pool.stats()`
+
+        Parameters
+        ----------
+        tokens : List[str]
+            Access tokens of different vk.com accounts
+        api_version : str
+            Version of the vk.com API to use
+        strategy : str
+            "round_robin" or "least_throttled", see TokenPool
+        requests_per_second : float
+            Max API requests per second of each token, None to disable
+        kwargs :
+            Any other option of VkScraper, max_workers should grow with the number of tokens
+        """
+        token_pool = TokenPool(tokens, api_version, strategy, requests_per_second)
+        return cls.from_token(tokens[0], api_version, token_pool=token_pool, **kwargs)
+
+    def _configure(
+        self,
+        transport: Optional[HttpTransport] = None,
+        max_workers: int = 4,
+        use_execute: bool = False,
+        requests_per_second: Optional[float] = 3,
+        max_retries: int = 5,
+        cache: Optional[ResponseCache] = None,
+        result_type: str = "dict",
+        payload: PayloadPolicy = "full",
+        token_pool: Optional[TokenPool] = None,
+        metrics: Optional[Metrics] = None,
+        video_resolution: str = "eager",
+    ) -> None:
+        """Sets up everything but the session, see __init__ for the parameters"""
+        if result_type not in ("dict", "compact"):
+            raise ValueError(f"unknown result_type {result_type}")
+        if video_resolution not in VIDEO_RESOLUTIONS:
+            raise ValueError(f"unknown video_resolution {video_resolution}")
+        if result_type == "dict" and payload == "raw":
+            raise ValueError('payload="raw" requires result_type="compact"')
+        self.result_type = result_type
+        self.payload = payload
+        self.transport = transport or HttpTransport()
+        self.max_workers = max_workers
+        self.metrics = metrics or Metrics()
+        self.batcher = ExecuteBatcher(self._run_concurrently) if use_execute else None
+        self.token_pool = token_pool
+        # a token pool rate limits each of its tokens instead
+        self.rate_limiter = (
+            TokenBucket(requests_per_second) if requests_per_second and not token_pool else None
+        )
+        self.max_retries = max_retries
+        self.cache = cache
+        self.video_resolution = video_resolution
+
+    def _api_call(self, method: str, params: dict) -> dict:
+        """Calls a vk.com API method with the session credentials and returns the decoded JSON"""
+        token = None
+        if self.token_pool is not None:
+            token = self.token_pool.acquire()
+            access_token, api_version = token.access_token, self.token_pool.api_version
+        else:
+            access_token, api_version = self.session.token["access_token"], self.session.api_version
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+        params = {**params, "access_token": access_token, "v": api_version}
+        api_res = self.transport.api(method, params, post=method == "execute", metrics=self.metrics)
+        if token is not None:
+            self.token_pool.report(token, api_res)  # type: ignore
+        if "error" in api_res:
+            error_code = api_res["error"].get("error_code")
+            self.metrics.count("api_errors", code="unknown" if error_code is None else error_code)
+            if error_code in THROTTLING_ERRORS:
+                self.metrics.count("throttled")
+        return api_res
+
+    def _call_many(
+        self, calls: List[ApiCall], batcher: Optional[ExecuteBatcher] = None
+    ) -> List[dict]:
+        """Runs several (method, params) API calls, responses keep the calls order.
+
+        Calls failing with a transient VK error are retried with jittered exponential backoff, up to max_retries
+        times, after which their error response is returned. Calls are coalesced with batcher if given,
+        otherwise with the scraper one when use_execute is set.
+        """
+        batcher = batcher or self.batcher
+        responses: List[dict] = [{} for _ in calls]
+        pending = list(range(len(calls)))
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                self.metrics.count("retries", len(pending))
+                time.sleep(backoff_delay(attempt - 1, self.RETRY_BACKOFF, self.MAX_RETRY_BACKOFF))
+            batch = [calls[i] for i in pending]
+            if batcher is not None and len(batch) > 1:
+                batch_responses = batcher.run(batch)
+            else:
+                batch_responses = self._run_concurrently(batch)
+            for i, api_res in zip(pending, batch_responses):
+                responses[i] = api_res
+            pending = [i for i in pending if self._is_retryable(responses[i])]
+            if not pending:
+                break
+        return responses
+
+    def _is_retryable(self, api_res: dict) -> bool:
+        """Whether a call failed with a transient error, or with one that another token of the pool avoids"""
+        error_code = api_res.get("error", {}).get("error_code")
+        if error_code in RETRYABLE_ERRORS:
+            return True
+        return self.token_pool is not None and self.token_pool.can_retry(error_code)
+
+    def _run_concurrently(self, calls: List[ApiCall]) -> List[dict]:
+        """Runs several (method, params) API calls with bounded concurrency, responses keep the calls order"""
+        if len(calls) <= 1 or self.max_workers <= 1:
+            return [self._api_call(method, params) for method, params in calls]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(calls))) as executor:
+            return list(executor.map(lambda call: self._api_call(*call), calls))
+
+    def _get_items(self, method: str, ids_param: str, ids: List[str], params: dict) -> List[dict]:
+        """
+        Fetches the API items for a list of ids like "-1_2", duplicates are removed and the ids are split
+        into chunks of at most ID_LIMITS[method] which are requested concurrently.
+
+        Returns
+        -------
+        a list with the raw API items, in the order of their first occurrence in ids.
+        """
+        return self._get_items_many([(method, ids_param, ids, params)])[0]
+
+    def _get_items_many(self, queries: List[ItemsQuery]) -> List[List[dict]]:
+        """Same as _get_items for several (method, ids_param, ids, params) queries sent together"""
+        unique_ids = [list(dict.fromkeys(ids)) for _, _, ids, _ in queries]
+        items_by_id: List[Dict[str, dict]] = [{} for _ in queries]
+        calls, chunks = [], []
+        for q, (method, ids_param, _, params) in enumerate(queries):
+            missing = unique_ids[q]
+            if self.cache is not None:
+                prefix = self._cache_prefix(method, params)
+                hits = self.cache.get_many(prefix + self._item_key(i) for i in missing)
+                for key, item in hits.items():
+                    items_by_id[q][key[len(prefix) :]] = item
+                missing = [i for i in missing if self._item_key(i) not in items_by_id[q]]
+                self.metrics.count("cache_hits", len(hits))
+                self.metrics.count("cache_misses", len(missing))
+            limit = self.ID_LIMITS[method]
+            for i in range(0, len(missing), limit):
+                chunk = missing[i : i + limit]
+                calls.append((method, {**params, ids_param: ",".join(chunk)}))
+                chunks.append((q, chunk))
+        fetched: List[Dict[str, dict]] = [{} for _ in queries]
+        for (q, chunk), api_res in zip(chunks, self._call_many(calls)):
+            if "error" in api_res:
+                # ids of a failed call are reported with the error instead of silently disappearing
+                for item_id in chunk:
+                    items_by_id[q][self._item_key(item_id)] = self._error_item(
+                        item_id, api_res["error"]
+                    )
+                continue
+            response = api_res.get("response", {})
+            for item in response if isinstance(response, list) else response.get("items", []):
+                fetched[q][f'{item["owner_id"]}_{item["id"]}'] = item
+        for q, (method, _, _, params) in enumerate(queries):
+            items_by_id[q].update(fetched[q])
+            if self.cache is not None and fetched[q]:
+                prefix = self._cache_prefix(method, params)
+                self.cache.set_many({prefix + key: item for key, item in fetched[q].items()})
+        # ids that VK did not return (deleted, private, ...) are left out
+        return [
+            [items[self._item_key(i)] for i in ids if self._item_key(i) in items]
+            for ids, items in zip(unique_ids, items_by_id)
+        ]
+
+    @staticmethod
+    def _cache_prefix(method: str, params: dict) -> str:
+        # the same object fetched with different params (eg: copy_history_depth) is cached separately
+        return f"{method}?{urlencode(sorted(params.items()))}|"
+
+    @staticmethod
+    def _error_item(item_id: str, error: dict) -> dict:
+        """Stands in for the API item of an id like "-1_2" whose call failed with a VK error object"""
+        owner_id, id_ = item_id.split("_")[:2]
+        return {
+            "owner_id": int(owner_id),
+            "id": int(id_),
+            "error": {"code": error.get("error_code"), "message": error.get("error_msg")},
+        }
+
+    @staticmethod
+    def _build_error_result(kind: str, item: dict) -> dict:
+        """Converts an _error_item into the payload described in the class documentation"""
+        return {
+            "id": f'{kind}{item["owner_id"]}_{item["id"]}',
+            "text": "",
+            "datetime": None,
+            "attachments": {},
+            "payload": {},
+            "error": item["error"],
+        }
+
+    def scrape(self, url: str, video_resolution: Optional[str] = None) -> List[Result]:
         """Scrapes a URL for multiple possibilities of inner links such as wall, video, photo, ...
 
+        Wall, photo and video lookups are sent together so that they run concurrently (or in a
+        single execute request when use_execute is set).
+
         Parameters
         ----------
         url : str
             The URL to parse and analyze content from, typically shared from vk.com feature
             or copy-pasted from the browser
+        video_resolution : str
+            "eager", "lazy" or "none", see __init__, defaults to the scraper one
 
         Returns
         -------
         a list of dict as specified in the class documentation.
         """
-        return self.scrape_walls(url) + self.scrape_photos(url) + self.scrape_videos(url)
+        return self._scrape_ids(*self._group_ids(extract_ids(url)), video_resolution)
+
+    def scrape_iter(
+        self, texts: Iterable[str], batch_size: int = 100, video_resolution: Optional[str] = None
+    ) -> Iterator[Result]:
+        """Scrapes a stream of texts/URLs, yielding results as soon as their batch is fetched.
+
+        Ids are extracted from each text as it is read and sent in batches of batch_size unique ids, so
+        memory does not grow with the input size and results start coming before the input is consumed.
+        Ids are only deduplicated within a batch.
+
+        Parameters
+        ----------
+        texts : Iterable[str]
+            Texts or URLs to scrape, eg: the lines of a message archive
+        batch_size : int
+            Number of wall, photo and video ids sent together
+        video_resolution : str
+            "eager", "lazy" or "none", see __init__, defaults to the scraper one
+
+        Returns
+        -------
+        an iterator of dict as specified in the class documentation, walls, photos and videos of each batch in that order.
+        """
+        if isinstance(texts, str):
+            texts = [texts]
+        batch: Dict[Tuple[str, int, int], VkId] = {}
+        for text in texts:
+            for vk_id in iter_ids(text):
+                key = (vk_id.type, vk_id.owner_id, vk_id.item_id)
+                # a repeated id keeps its first occurrence, with the access key of a later one if needed
+                if key not in batch or (vk_id.access_key and not batch[key].access_key):
+                    batch[key] = batch.get(key, vk_id)._replace(access_key=vk_id.access_key)
+            if len(batch) >= batch_size:
+                yield from self._scrape_ids(*self._group_ids(batch.values()), video_resolution)
+                batch = {}
+        if batch:
+            yield from self._scrape_ids(*self._group_ids(batch.values()), video_resolution)
+
+    @staticmethod
+    def _group_ids(ids: Iterable[VkId]) -> Tuple[List[str], List[str], List[str]]:
+        """Splits extracted ids into wall, photo and video id lists like "wall-1_2" """
+        groups: Dict[str, List[str]] = {"wall": [], "photo": [], "video": []}
+        for vk_id in ids:
+            groups[vk_id.type].append(vk_id.full_id)
+        return groups["wall"], groups["photo"], groups["video"]
+
+    def _scrape_ids(
+        self,
+        wall_ids: List[str],
+        photo_ids: List[str],
+        video_ids: List[str],
+        video_resolution: Optional[str] = None,
+    ) -> List[Result]:
+        """Fetches wall, photo and video ids in one go and returns their results in that order"""
+        walls, photos, videos = self._get_items_many(
+            [
+                self._wall_query(wall_ids),
+                self._photo_query(photo_ids),
+                self._video_query(video_ids),
+            ]
+        )
+        return self._finalize(
+            self._build_wall_results(walls, video_resolution)
+            + [self._build_photo_result(item) for item in photos]
+            + [self._build_video_result(item) for item in videos]
+        )
 
-    def scrape_walls(self, url: str) -> List:
+    def _finalize(self, results: List[dict]) -> List[Result]:
+        """Applies the result_type and payload options to freshly built result dicts"""
+        if self.result_type == "compact":
+            return [to_record(r, self.payload) for r in results]
+        if self.payload != "full":
+            for r in results:
+                r["payload"] = apply_payload_policy(r, self.payload)
+        return list(results)
+
+    @staticmethod
+    def _wall_query(wall_ids: List[str], copy_history_depth: int = 2) -> ItemsQuery:
+        # docs: https://dev.vk.com/method/wall.getById
+        return (
+            "wall.getById",
+            "posts",
+            [wall_id.replace("wall", "") for wall_id in wall_ids],
+            {"extended": "1", "copy_history_depth": str(copy_history_depth)},
+        )
+
+    @staticmethod
+    def _photo_query(photo_ids: List[str]) -> ItemsQuery:
+        # docs: https://dev.vk.com/method/photos.getById
+        return (
+            "photos.getById",
+            "photos",
+            [photo_id.replace("photo", "") for photo_id in photo_ids],
+            {"extended": "1"},
+        )
+
+    @staticmethod
+    def _video_query(video_ids: List[str]) -> ItemsQuery:
+        # docs: https://dev.vk.com/method/video.get
+        return (
+            "video.get",
+            "videos",
+            [video_id.replace("video", "") for video_id in video_ids],
+            {"extended": "1"},
+        )
+
+    def scrape_walls(self, url: str, video_resolution: Optional[str] = None) -> List[Result]:
         """Scrapes a URL for multiple wall data
 
         Parameters
         ----------
         url : str
             The URL to parse - should contain something like "...wall1212_3434..."
+        video_resolution : str
+            "eager", "lazy" or "none", see __init__, defaults to the scraper one
 
         Returns
         -------
         a list of dict as specified in the class documentation.
         """
-        wall_ids = self.WALL_PATTERN.findall(url)
-        return self.scrape_wall_ids(wall_ids)
+        wall_ids = [vk_id.full_id for vk_id in extract_ids(url, {"wall"})]
+        return self.scrape_wall_ids(wall_ids, video_resolution=video_resolution)
 
-    def scrape_wall_ids(self, wall_ids: List[str], copy_history_depth: int = 2) -> List[dict]:
+    def scrape_wall_ids(
+        self,
+        wall_ids: List[str],
+        copy_history_depth: int = 2,
+        video_resolution: Optional[str] = None,
+    ) -> List[Result]:
         """
         Receives a list of wall ids like wall123123_1231 see `api docs <https://dev.vk.com/method/wall.getById>`__
+        Duplicated ids are requested once and long lists are split into chunks that are fetched concurrently.
 
         Parameters
         ----------
@@ -115,6 +556,9 @@ class VkScraper:
             list with valid wall ids like "wall123123_1231"
         copy_history_depth : int
             see `api docs <https://dev.vk.com/method/wall.getById>`__
+        video_resolution : str
+            "eager", "lazy" or "none", see __init__, defaults to the scraper one, with "none" (or "lazy" when
+            the videos are never read) a batch of up to ID_LIMITS["wall.getById"] posts costs one API call
 
         Returns
         -------
@@ -122,77 +566,114 @@ class VkScraper:
         """
         if not len(wall_ids):
             return []
-        wall_ids = [wall_id.replace("wall", "") for wall_id in wall_ids]
-        # docs: https://dev.vk.com/method/wall.getById
-        headers = {
-            "access_token": self.session.token["access_token"],
-            "posts": ",".join(wall_ids),
-            "extended": "1",
-            "copy_history_depth": str(copy_history_depth),
-            "v": self.session.api_version,
-        }
-        req = requests.get("https://api.vk.com/method/wall.getById", headers)
-        api_res = req.json()
+        items = self._get_items(*self._wall_query(wall_ids, copy_history_depth))
+        return self._finalize(self._build_wall_results(items, video_resolution))
+
+    def _build_wall_results(
+        self, items: List[dict], video_resolution: Optional[str] = None
+    ) -> List[dict]:
+        """Converts wall.getById items into the payload described in the class documentation"""
+        video_resolution = video_resolution or self.video_resolution
+        if video_resolution not in VIDEO_RESOLUTIONS:
+            raise ValueError(f"unknown video_resolution {video_resolution}")
         res = []
-        for item in api_res.get("response", {}).get("items", []):
-            attachments_json = item.get("attachments", []) + sum(
-                [x.get("attachments", []) for x in item.get("copy_history", [])], []
-            )
-            attachments = defaultdict(list)
-            for a in attachments_json:
-                try:
-                    first_type = a["type"]
-                    attachment = a[first_type]
-                    if first_type == "video":
-                        video_path = f'video{attachment["owner_id"]}_{attachment["id"]}'
-                        if "access_key" in attachment:
-                            video_path += f"_{attachment['access_key']}"
-                        attachments["video"].extend(
-                            self.scrape_videos(video_path)[0]
-                            .get("attachments", {})
-                            .get("video", [""])
-                        )
-                        continue
-                    if first_type == "link":
-                        attachments["link"].append(attachment["url"])
-                        if "photo" in attachment:
-                            attachment = attachment["photo"]
-                            first_type = "photo"
-                        elif "video" in attachment:
-                            attachment = attachment["video"]
-                            attachments["video"].extend(
-                                self.scrape_videos(
-                                    f'video{attachment["owner_id"]}_{attachment["id"]}'
-                                )[0]
-                                .get("attachments", {})
-                                .get("video", [""])
-                            )
-                            continue
-                        else:
+        # video attachments only carry ids, their player urls are resolved afterwards
+        # in as few video.get calls as possible instead of one call per attachment
+        video_ids: List[str] = []
+        with self.metrics.stage("parse_walls"):
+            for item in items:
+                if "error" in item:
+                    res.append(self._build_error_result("wall", item))
+                    continue
+                attachments_json = item.get("attachments", []) + sum(
+                    [x.get("attachments", []) for x in item.get("copy_history", [])], []
+                )
+                attachments = defaultdict(list)
+                for a in attachments_json:
+                    try:
+                        first_type = a["type"]
+                        attachment = a[first_type]
+                        if first_type == "video":
+                            video_id = f'{attachment["owner_id"]}_{attachment["id"]}'
+                            if "access_key" in attachment:
+                                video_id += f"_{attachment['access_key']}"
+                            attachments["video"].append(video_id)
+                            video_ids.append(video_id)
                             continue
-
-                    if "thumb" in attachment:
-                        attachment = attachment["thumb"]
-                    if "sizes" in attachment:
-                        try:
-                            attachments[first_type].append(attachment["sizes"][-1]["url"])
-                        except Exception as e:
-                            print(f"could not get image from attachment: {e}")
-                except Exception as e:
-                    print(f"Unexpected error in attachment={a}: {e}")
-
-            res.append(
-                {
-                    "id": f'wall{item["owner_id"]}_{item["id"]}',
-                    "text": item.get("text", ""),
-                    "datetime": datetime.utcfromtimestamp(item.get("date", 0)),
-                    "attachments": dict(attachments),
-                    "payload": item,
-                }
-            )
+                        if first_type == "link":
+                            attachments["link"].append(attachment["url"])
+                            if "photo" in attachment:
+                                attachment = attachment["photo"]
+                                first_type = "photo"
+                            elif "video" in attachment:
+                                attachment = attachment["video"]
+                                video_id = f'{attachment["owner_id"]}_{attachment["id"]}'
+                                attachments["video"].append(video_id)
+                                video_ids.append(video_id)
+                                continue
+                            else:
+                                continue
+
+                        if "thumb" in attachment:
+                            attachment = attachment["thumb"]
+                        if "sizes" in attachment:
+                            try:
+                                attachments[first_type].append(attachment["sizes"][-1]["url"])
+                            except Exception as e:
+                                logger.warning(f"could not get image from attachment: {e}")
+                    except Exception as e:
+                        logger.warning(f"Unexpected error in attachment={a}: {e}")
+
+                res.append(
+                    {
+                        "id": f'wall{item["owner_id"]}_{item["id"]}',
+                        "text": item.get("text", ""),
+                        "datetime": datetime.utcfromtimestamp(item.get("date", 0)),
+                        "attachments": attachments,
+                        "payload": item,
+                    }
+                )
+
+        players: Dict[str, str] = {}
+        if video_resolution == "eager":
+            players = self._get_video_players(video_ids)
+        # shared by the posts of this batch, so that reading any of their videos looks them all up at once
+        resolver = VideoResolver(self._get_video_players, video_ids)
+        for r in res:
+            attachments = r["attachments"]
+            if "video" in attachments:
+                if video_resolution == "lazy":
+                    attachments["video"] = LazyVideos(attachments["video"], resolver)
+                elif video_resolution == "none":
+                    attachments["video"] = [video_page_url(v) for v in attachments["video"]]
+                else:
+                    attachments["video"] = players_for(attachments["video"], players)
+                    if not attachments["video"]:
+                        del attachments["video"]
+            r["attachments"] = dict(attachments)
         return res
 
-    def scrape_videos(self, url: str) -> List[dict]:
+    def _get_video_players(self, video_ids: List[str]) -> Dict[str, str]:
+        """
+        Resolves video ids like 123123_1231 (optionally with an access key) into their player urls
+        with as few video.get calls as the API allows.
+
+        Returns
+        -------
+        a dict from "owner_id_video_id" to the player url.
+        """
+        players = {}
+        for item in self._get_items(*self._video_query(video_ids)):
+            if "error" not in item:
+                players[f'{item["owner_id"]}_{item["id"]}'] = item.get("player", "")
+        return players
+
+    @staticmethod
+    def _item_key(item_id: str) -> str:
+        # drops the optional access key: "-1_2_abcdef" -> "-1_2"
+        return "_".join(item_id.split("_")[:2])
+
+    def scrape_videos(self, url: str) -> List[Result]:
         """Scrapes a URL for multiple video data
 
         Parameters
@@ -204,12 +685,12 @@ class VkScraper:
         -------
         a list of dict as specified in the class documentation.
         """
-        video_ids = self.VIDEO_PATTERN.findall(url)
-        return self.scrape_video_ids(video_ids)
+        return self.scrape_video_ids([vk_id.full_id for vk_id in extract_ids(url, {"video"})])
 
-    def scrape_video_ids(self, video_ids: List[str]) -> List[dict]:
+    def scrape_video_ids(self, video_ids: List[str]) -> List[Result]:
         """
         Receives a list of video ids like video123123_1231 see `api docs <https://dev.vk.com/method/video.get>`__
+        Duplicated ids are requested once and long lists are split into chunks that are fetched concurrently.
 
         Parameters
         ----------
@@ -222,33 +703,25 @@ class VkScraper:
         """
         if not len(video_ids):
             return []
-        video_ids = [video_id.replace("video", "") for video_id in video_ids]
-
-        headers = {
-            "access_token": self.session.token["access_token"],
-            "videos": ",".join(video_ids),
-            "extended": "1",
-            "v": self.session.api_version,
+        items = self._get_items(*self._video_query(video_ids))
+        return self._finalize([self._build_video_result(item) for item in items])
+
+    @staticmethod
+    def _build_video_result(item: dict) -> dict:
+        """Converts a video.get item into the payload described in the class documentation"""
+        if "error" in item:
+            return VkScraper._build_error_result("video", item)
+        return {
+            "id": f'video{item["owner_id"]}_{item["id"]}',
+            "text": item.get("title", ""),
+            "datetime": datetime.utcfromtimestamp(item.get("date", 0)),
+            "attachments": {
+                "video": [item.get("player", "")],
+            },
+            "payload": item,
         }
-        req = requests.get("https://api.vk.com/method/video.get", headers)
-
-        api_res = req.json()
-        res = []
-        for item in api_res.get("response", {}).get("items", []):
-            res.append(
-                {
-                    "id": f'video{item["owner_id"]}_{item["id"]}',
-                    "text": item.get("title", ""),
-                    "datetime": datetime.utcfromtimestamp(item.get("date", 0)),
-                    "attachments": {
-                        "video": [item.get("player", "")],
-                    },
-                    "payload": item,
-                }
-            )
-        return res
 
-    def scrape_photos(self, url: str) -> List[dict]:
+    def scrape_photos(self, url: str) -> List[Result]:
         """Scrapes a URL for multiple photo data
 
         Parameters
@@ -260,12 +733,12 @@ class VkScraper:
         -------
         a list of dict as specified in the class documentation.
         """
-        photo_ids = self.PHOTO_PATTERN.findall(url)
-        return self.scrape_photo_ids(photo_ids)
+        return self.scrape_photo_ids([vk_id.full_id for vk_id in extract_ids(url, {"photo"})])
 
-    def scrape_photo_ids(self, photo_ids: List[str]) -> List[dict]:
+    def scrape_photo_ids(self, photo_ids: List[str]) -> List[Result]:
         """
         Receives a list of photo ids like photo123123_1231 see `api docs <https://dev.vk.com/method/photos.getById>`__
+        Duplicated ids are requested once and long lists are split into chunks that are fetched concurrently.
 
         Parameters
         ----------
@@ -278,87 +751,109 @@ class VkScraper:
         """
         if not len(photo_ids):
             return []
-        photo_ids = [photo_id.replace("photo", "") for photo_id in photo_ids]
-
-        headers = {
-            "access_token": self.session.token["access_token"],
-            "photos": ",".join(photo_ids),
-            "extended": "1",
-            "v": self.session.api_version,
+        items = self._get_items(*self._photo_query(photo_ids))
+        return self._finalize([self._build_photo_result(item) for item in items])
+
+    @staticmethod
+    def _build_photo_result(item: dict) -> dict:
+        """Converts a photos.getById item into the payload described in the class documentation"""
+        if "error" in item:
+            return VkScraper._build_error_result("photo", item)
+        return {
+            "id": f'photo{item["owner_id"]}_{item["id"]}',
+            "text": item.get("text", ""),
+            "datetime": datetime.utcfromtimestamp(item.get("date", 0)),
+            "attachments": {"photo": [item["orig_photo"]["url"]]},
+            "payload": item,
         }
-        req = requests.get("https://api.vk.com/method/photos.getById", headers)
-
-        api_res = req.json()
-        res = []
-        for item in api_res.get("response", []):
-            res.append(
-                {
-                    "id": f'photo{item["owner_id"]}_{item["id"]}',
-                    "text": item.get("text", ""),
-                    "datetime": datetime.utcfromtimestamp(item.get("date", 0)),
-                    "attachments": {"photo": [item["orig_photo"]["url"]]},
-                    "payload": item,
-                }
-            )
-        return res
 
-    def download_media(self, results: List[dict], destination: str = "./output/") -> List[str]:
+    def download_media(
+        self,
+        results: List[Result],
+        destination: str = "./output/",
+        photo_workers: int = 8,
+        video_workers: int = 2,
+        max_per_host: int = 4,
+        chunk_size: int = 1024 * 1024,
+        cache: bool = False,
+        segmented: Optional[Dict[str, SegmentedDownload]] = None,
+    ) -> List[str]:
         """
         Receives a list of dicts as returned by any of the scrape* methods and downloads the URLS present
         if they are of type photo or video into the destination folder
 
+        Photos and videos are downloaded in parallel by separate worker pools.
+
         Parameters
         ----------
         results : List[dict]
             list with valid dictionary results (see class definition)
         destination : str
             the directory to save the downloaded files to. defaults to output/
+        photo_workers : int
+            number of photos downloaded at the same time
+        video_workers : int
+            number of videos downloaded at the same time
+        max_per_host : int
+            max number of concurrent downloads from the same host
+        chunk_size : int
+            photos are streamed to disk in chunks of this many bytes
+        cache : bool
+            if set, a manifest of the downloads is kept in the destination folder so that re-runs skip files
+            already downloaded, resume interrupted ones and store media shared by several results only once
+        segmented : Dict[str, SegmentedDownload]
+            media types whose large files are downloaded in concurrent byte ranges, eg:
+            {"photo": SegmentedDownload(segments=4, min_size=2 * 1024 * 1024), "video": SegmentedDownload(8)},
+            each such file uses `segments` connections on top of max_per_host, see MediaDownloader
 
         Returns
         -------
-        a list of filenames for the downloaded files
+        a list of filenames for the downloaded files, in the same order as the results (failed downloads are left out)
         """
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/81.0.4044.138 Safari/537.36"
-        }
+        with self.media_downloader(
+            destination, max_per_host, chunk_size, cache, segmented
+        ) as downloader:
+            return downloader.download_all(
+                self.download_tasks(results, destination), photo_workers, video_workers
+            )
+
+    @contextmanager
+    def media_downloader(
+        self,
+        destination: str = "./output/",
+        max_per_host: int = 4,
+        chunk_size: int = 1024 * 1024,
+        cache: bool = False,
+        segmented: Optional[Dict[str, SegmentedDownload]] = None,
+    ) -> Iterator[MediaDownloader]:
+        """Creates the destination folder and a MediaDownloader sharing the transport and metrics of the
+        scraper, closed (and its manifest saved) on exit, see download_media for the parameters"""
         os.makedirs(destination, exist_ok=True)
-        downloaded = []
+        manifest = (
+            DownloadManifest(os.path.join(destination, self.MANIFEST_FILENAME)) if cache else None
+        )
+        downloader = MediaDownloader(
+            self.transport, max_per_host, chunk_size, manifest, self.metrics, segmented
+        )
+        try:
+            yield downloader
+        finally:
+            downloader.close()
+            if manifest is not None:
+                manifest.save()
+
+    @staticmethod
+    def download_tasks(results: List[Result], destination: str) -> List[DownloadTask]:
+        """Lists the (type, url, filename) of every photo and video to download, in results order"""
+        tasks = []
         for r in results:
             for k, attachments in r["attachments"].items():
                 if k == "photo":
                     for i, url in enumerate(attachments):
                         ext = os.path.splitext(urlparse(url).path)[1]
-                        filename = os.path.join(destination, f"{r['id']}_{i}{ext}")
-                        d = requests.get(url, headers=headers)
-                        with open(filename, "wb") as f:
-                            f.write(d.content)
-                            downloaded.append(filename)
+                        tasks.append((k, url, os.path.join(destination, f"{r['id']}_{i}{ext}")))
                 elif k == "video":
-                    with suppress_stdout():  # ytdlp is not 100% quiet
-                        for i, url in enumerate(attachments):
-                            filename = os.path.join(destination, f"{r['id']}_{i}.%(ext)s")
-                            ydl = yt_dlp.YoutubeDL(
-                                {
-                                    "format": (
-                                        "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best"
-                                    ),
-                                    "merge_output_format": "mp4",
-                                    "retries": 5,
-                                    "noplaylist": True,
-                                    "outtmpl": filename,
-                                    "quiet": True,
-                                    "restrictfilenames": True,
-                                    "forcefilename": True,
-                                    "simulate": False,
-                                }
-                            )
-                            info = ydl.extract_info(url, download=True)
-                            filename = ydl.prepare_filename(info)
-                            if "unknown_video" in filename:
-                                old_filename = filename
-                                filename = shutil.copy(
-                                    filename, filename.replace("unknown_video", "mp4")
-                                )
-                                os.remove(old_filename)
-                            downloaded.append(filename)
-        return downloaded
+                    for i, url in enumerate(attachments):
+                        # yt-dlp picks the extension
+                        tasks.append((k, url, os.path.join(destination, f"{r['id']}_{i}.%(ext)s")))
+        return tasks
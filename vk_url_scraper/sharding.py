@@ -0,0 +1,119 @@
+import itertools
+import json
+import multiprocessing
+import os
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+from .extractor import VkId, extract_ids_from_file
+from .scraper import VkScraper
+from .utils import dumps
+
+# the scraper of the current worker process, created once by _init_worker
+_worker_scraper: Optional[VkScraper] = None
+
+
+def run_sharded(
+    input_filename: str,
+    output_filename: str,
+    tokens: Sequence[str],
+    processes: Optional[int] = None,
+    batch_size: int = 100,
+    checkpoint_filename: Optional[str] = None,
+    scraper_factory: Callable[[str], VkScraper] = VkScraper.from_token,
+) -> int:
+    """Scrapes every id of a large text file with several worker processes into an NDJSON file.
+
+    Ids are extracted and deduplicated across the whole input by this process, then sent in batches of
+    batch_size ids to the workers, each with its own VkScraper and token. Results are written one per
+    line in input order, batch by batch (walls, photos and videos of each batch, like scrape_iter).
+    After each written batch a checkpoint is saved so that running the same command again after a crash
+    resumes after the last complete batch.
+
+    Parameters
+    ----------
+    input_filename : str
+        utf-8 text file with vk.com urls or ids, like a chat export
+    output_filename : str
+        NDJSON file the results are written to, replaced unless the run is resumed
+    tokens : List[str]
+        Access tokens, the i-th started worker uses tokens[i % len(tokens)]
+    processes : int
+        Number of worker processes, defaults to one per token
+    batch_size : int
+        Number of ids scraped together by a worker
+    checkpoint_filename : str
+        Where the progress is saved, defaults to output_filename + ".checkpoint"
+    scraper_factory : func
+        Creates the VkScraper of a worker from its token, it must be picklable (eg: a module function
+        or a functools.partial of VkScraper.from_token with more options like api_version)
+
+    Returns
+    -------
+    the number of results written by this run
+    """
+    if not tokens:
+        raise ValueError("at least one token is needed")
+    processes = processes or len(tokens)
+    checkpoint_filename = checkpoint_filename or f"{output_filename}.checkpoint"
+    checkpoint = {"input": os.path.abspath(input_filename), "batch_size": batch_size}
+    done, offset = 0, 0
+    if os.path.isfile(checkpoint_filename):
+        with open(checkpoint_filename) as f:
+            saved = json.load(f)
+        if {k: saved.get(k) for k in checkpoint} != checkpoint:
+            raise ValueError(
+                f"{checkpoint_filename} belongs to another input or batch size, remove it to start over"
+            )
+        done, offset = saved["batches"], saved["offset"]
+
+    batches = itertools.islice(
+        _batches(extract_ids_from_file(input_filename), batch_size), done, None
+    )
+    # workers take the next token round robin, including those the pool starts to replace a dead one
+    started = multiprocessing.Value("i", 0)
+    written = 0
+    with open(output_filename, "ab" if offset else "wb") as output, multiprocessing.Pool(
+        processes, _init_worker, (started, list(tokens), scraper_factory)
+    ) as pool:
+        # drop what a crashed run wrote after its last checkpoint
+        output.truncate(offset)
+        # imap hands out batches to any free worker but yields their results in order
+        for lines, count in pool.imap(_scrape_batch, batches):
+            output.write(lines.encode())
+            output.flush()
+            done += 1
+            written += count
+            _save_checkpoint(
+                checkpoint_filename, {**checkpoint, "batches": done, "offset": output.tell()}
+            )
+    return written
+
+
+def _batches(ids: Iterator[VkId], batch_size: int) -> Iterator[List[VkId]]:
+    while True:
+        batch = list(itertools.islice(ids, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _init_worker(started, tokens: List[str], scraper_factory) -> None:
+    global _worker_scraper
+    with started.get_lock():
+        index = started.value
+        started.value += 1
+    _worker_scraper = scraper_factory(tokens[index % len(tokens)])
+
+
+def _scrape_batch(batch: List[VkId]) -> Tuple[str, int]:
+    """Scrapes a batch in a worker and returns its results already serialized, with their count"""
+    assert _worker_scraper is not None
+    results = _worker_scraper._scrape_ids(*_worker_scraper._group_ids(batch))
+    return "".join(f"{dumps(result)}\n" for result in results), len(results)
+
+
+def _save_checkpoint(filename: str, checkpoint: dict) -> None:
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_filename, filename)
@@ -0,0 +1,167 @@
+import itertools
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+from .ratelimit import (
+    CAPTCHA_NEEDED,
+    FLOOD_CONTROL,
+    RATE_LIMIT_REACHED,
+    TOO_MANY_REQUESTS_PER_SECOND,
+    USER_AUTHORIZATION_FAILED,
+    TokenBucket,
+)
+
+
+class TokenSession:
+    """Minimal stand-in for a vk_api.VkApi session holding an already known access token.
+
+    VkScraper only reads `token["access_token"]` and `api_version` from its session, so this avoids
+    importing vk_api, reading/writing its config file and authenticating.
+    """
+
+    # same default as vk_api.VkApi
+    API_VERSION = "5.92"
+
+    def __init__(self, access_token: str, api_version: str = API_VERSION) -> None:
+        """
+        Parameters
+        ----------
+        access_token : str
+            Access token of a vk.com account or service app
+        api_version : str
+            Version of the vk.com API sent with every call
+        """
+        self.token = {"access_token": access_token}
+        self.api_version = api_version
+
+
+class PooledToken:
+    """An access token of a TokenPool with its own rate limiter and usage counters"""
+
+    def __init__(self, access_token: str, rate_limiter: Optional[TokenBucket]) -> None:
+        self.access_token = access_token
+        self.rate_limiter = rate_limiter
+        # API requests sent with this token, responses with an error and errors that benched it
+        self.calls = 0
+        self.errors = 0
+        self.throttled = 0
+        self.last_throttled = float("-inf")
+        self.benched_until = float("-inf")
+
+    def stats(self) -> dict:
+        """Usage counters of the token, which is only identified by its last characters"""
+        return {
+            "token": f"...{self.access_token[-4:]}",
+            "calls": self.calls,
+            "errors": self.errors,
+            "throttled": self.throttled,
+            "benched_until": self.benched_until if self.benched_until > 0 else None,
+        }
+
+
+class TokenPool:
+    """Spreads the API calls of a VkScraper over the access tokens of several accounts.
+
+    Each token gets its own rate limiter, so the pool sustains len(tokens) times the rate of a single
+    account (raise the scraper max_workers accordingly). A token answered with a throttling or
+    authorization error is benched, ie: not used for BENCH_SECONDS[error code], and the call is retried
+    with another token.
+    """
+
+    # how long a token is left out after each error, per VK error code
+    BENCH_SECONDS = {
+        TOO_MANY_REQUESTS_PER_SECOND: 1.0,
+        FLOOD_CONTROL: 60.0,
+        CAPTCHA_NEEDED: 300.0,
+        RATE_LIMIT_REACHED: 3600.0,
+        USER_AUTHORIZATION_FAILED: 3600.0,
+    }
+    STRATEGIES = ("round_robin", "least_throttled")
+
+    def __init__(
+        self,
+        tokens: Sequence[str],
+        api_version: str = TokenSession.API_VERSION,
+        strategy: str = "round_robin",
+        requests_per_second: Optional[float] = 3,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        tokens : List[str]
+            Access tokens of different vk.com accounts
+        api_version : str
+            Version of the vk.com API sent with every call
+        strategy : str
+            "round_robin" to use the tokens in turn or "least_throttled" to prefer the token throttled
+            the longest time ago (then the least used one)
+        requests_per_second : float
+            Max API requests per second of each token, None to disable
+        clock : func
+            Monotonic clock in seconds, overridable for tests
+        """
+        if not tokens:
+            raise ValueError("a TokenPool needs at least one token")
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"unknown strategy {strategy}")
+        self.api_version = api_version
+        self.strategy = strategy
+        self.clock = clock
+        self.tokens = [
+            PooledToken(token, TokenBucket(requests_per_second) if requests_per_second else None)
+            for token in tokens
+        ]
+        self.lock = threading.Lock()
+        self.turns = itertools.cycle(range(len(self.tokens)))
+
+    def acquire(self) -> PooledToken:
+        """Picks the token for the next API call, waiting for its rate limiter if needed.
+
+        When every token is benched, the one whose bench ends first is used anyway.
+        """
+        with self.lock:
+            now = self.clock()
+            available = [t for t in self.tokens if t.benched_until <= now]
+            if not available:
+                token = min(self.tokens, key=lambda t: t.benched_until)
+            elif self.strategy == "least_throttled":
+                token = min(available, key=lambda t: (t.last_throttled, t.calls))
+            else:
+                token = self.tokens[next(self.turns)]
+                while token not in available:
+                    token = self.tokens[next(self.turns)]
+            token.calls += 1
+        if token.rate_limiter is not None:
+            token.rate_limiter.acquire()
+        return token
+
+    def report(self, token: PooledToken, api_res: dict) -> None:
+        """Updates the counters of token with the response of a call made with it, benching it if needed"""
+        error_codes = [e.get("error_code") for e in api_res.get("execute_errors") or []]
+        if "error" in api_res:
+            error_codes.append(api_res["error"].get("error_code"))
+        if not error_codes:
+            return
+        with self.lock:
+            token.errors += 1
+            bench = max(self.BENCH_SECONDS.get(code, 0.0) for code in error_codes)
+            if bench > 0:
+                now = self.clock()
+                token.throttled += 1
+                token.last_throttled = now
+                token.benched_until = max(token.benched_until, now + bench)
+
+    def can_retry(self, error_code: Optional[int]) -> bool:
+        """Whether a call that failed with error_code may succeed with another token right now"""
+        if error_code not in self.BENCH_SECONDS:
+            return False
+        with self.lock:
+            now = self.clock()
+            return any(t.benched_until <= now for t in self.tokens)
+
+    def stats(self) -> List[Dict]:
+        """Usage counters of each token, in the order they were given"""
+        with self.lock:
+            return [token.stats() for token in self.tokens]
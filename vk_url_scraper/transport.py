@@ -0,0 +1,110 @@
+from typing import Dict, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .metrics import Metrics
+from .utils import loads
+
+Timeout = Union[float, Tuple[float, float]]
+
+
+class HttpTransport:
+    """Keep-alive HTTP transport shared by every API and media call of a VkScraper.
+
+    Connections are pooled per host so that consecutive calls to api.vk.com and to the
+    userapi CDN hosts reuse their TCP/TLS connections instead of doing a new handshake each time.
+    """
+
+    API_URL = "https://api.vk.com/method/"
+
+    def __init__(
+        self,
+        session: Optional[requests.Session] = None,
+        timeout: Optional[Timeout] = (10, 60),
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        host_pool_sizes: Optional[Dict[str, int]] = None,
+        max_retries: int = 0,
+        api_url: Optional[str] = None,
+    ) -> None:
+        """Initializes the transport.
+
+        Parameters
+        ----------
+        session : requests.Session
+            Optional session to use instead of creating one, it is used as given (no adapters are mounted on it)
+        timeout : float or (float, float)
+            Default (connect, read) timeout in seconds applied to every request, None to wait forever
+        pool_connections : int
+            Number of distinct hosts to keep connection pools for
+        pool_maxsize : int
+            Max number of connections kept alive per host
+        host_pool_sizes : Dict[str, int]
+            Overrides pool_maxsize for specific hosts, eg: {"api.vk.com": 4, "sun9-1.userapi.com": 16}
+        max_retries : int
+            Number of retries on connection errors (not on HTTP error codes)
+        api_url : str
+            Base URL of the API methods, defaults to API_URL, eg: a local stand-in for tests and benchmarks
+        """
+        self.api_url = api_url or self.API_URL
+        self.timeout = timeout
+        self.owns_session = session is None
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=pool_connections,
+                pool_maxsize=pool_maxsize,
+                max_retries=max_retries,
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            for host, maxsize in (host_pool_sizes or {}).items():
+                host_adapter = HTTPAdapter(
+                    pool_connections=1, pool_maxsize=maxsize, max_retries=max_retries
+                )
+                session.mount(f"https://{host}/", host_adapter)
+                session.mount(f"http://{host}/", host_adapter)
+        self.session = session
+
+    def get(self, url: str, params: Optional[dict] = None, **kwargs) -> requests.Response:
+        """Performs a GET request on the pooled session, kwargs are passed on to requests"""
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.get(url, params=params, **kwargs)
+
+    def post(self, url: str, data: Optional[dict] = None, **kwargs) -> requests.Response:
+        """Performs a POST request on the pooled session, kwargs are passed on to requests"""
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.post(url, data=data, **kwargs)
+
+    def api(
+        self, method: str, params: dict, post: bool = False, metrics: Optional[Metrics] = None
+    ) -> dict:
+        """Calls a vk.com API method like "wall.getById" and returns the decoded JSON response,
+        use post for calls whose parameters may not fit in a URL, the request is recorded in metrics if given
+        """
+        if metrics is None:
+            return loads(self._api_response(method, params, post).content)
+        with metrics.stage("api_request", method=method):
+            response = self._api_response(method, params, post)
+        with metrics.stage("json_decode", method=method):
+            api_res = loads(response.content)
+        metrics.count("api_requests", method=method)
+        metrics.count("api_bytes", len(response.content))
+        return api_res
+
+    def _api_response(self, method: str, params: dict, post: bool) -> requests.Response:
+        if post:
+            return self.post(self.api_url + method, params)
+        return self.get(self.api_url + method, params)
+
+    def close(self) -> None:
+        """Closes pooled connections, an injected session is left open for its owner"""
+        if self.owns_session:
+            self.session.close()
+
+    def __enter__(self) -> "HttpTransport":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
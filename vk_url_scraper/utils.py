@@ -3,6 +3,16 @@ import os
 import sys
 from contextlib import contextmanager
 from datetime import datetime
+from functools import partial
+from typing import Any, Union
+
+from .attachments import LazyVideos
+from .records import ScrapeResult
+
+try:  # optional, much faster than the json module for large results: pip install vk-url-scraper[fast]
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
 
 
 class DateTimeEncoder(json.JSONEncoder):
@@ -10,9 +20,65 @@ class DateTimeEncoder(json.JSONEncoder):
     def default(self, o):
         if isinstance(o, datetime):
             return str(o)  # with timezone
+        if isinstance(o, ScrapeResult):
+            return o.to_dict()
+        if isinstance(o, LazyVideos):
+            return o.urls()
         return json.JSONEncoder.default(self, o)
 
 
+def _default(o: Any, iso_datetimes: bool = False) -> Any:
+    if isinstance(o, datetime):
+        return o.isoformat() if iso_datetimes else str(o)
+    if isinstance(o, ScrapeResult):
+        return o.to_dict()
+    if isinstance(o, LazyVideos):
+        return o.urls()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any, indent: bool = False, iso_datetimes: bool = False) -> str:
+    """Serializes results (dicts or ScrapeResult) to JSON, with orjson when it is installed.
+
+    Parameters
+    ----------
+    obj : Any
+        what to serialize, usually a list of results
+    indent : bool
+        pretty print with an indentation of 2 spaces, the default is compact output on a single line
+    iso_datetimes : bool
+        datetimes as ISO 8601 ("2021-08-06T11:32:26"), encoded natively by orjson without calling back
+        into python, otherwise they keep the str() format of DateTimeEncoder ("2021-08-06 11:32:26")
+
+    Returns
+    -------
+    the JSON document, non-ASCII characters are not escaped
+    """
+    if orjson is not None:
+        option = orjson.OPT_PASSTHROUGH_DATACLASS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if not iso_datetimes:
+            option |= orjson.OPT_PASSTHROUGH_DATETIME
+        return orjson.dumps(
+            obj, default=partial(_default, iso_datetimes=iso_datetimes), option=option
+        ).decode()
+    return json.dumps(
+        obj,
+        ensure_ascii=False,
+        indent=2 if indent else None,
+        separators=None if indent else (",", ":"),
+        default=partial(_default, iso_datetimes=iso_datetimes),
+    )
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Parses a JSON document, like an API response body, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
 def captcha_handler(captcha):
     key = input(
         f"CAPTCHA DETECTED, please solve it and input the solution. url= {captcha.get_url()} :"